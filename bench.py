@@ -0,0 +1,286 @@
+"""Offline benchmarks for brief
+
+Starts a local HTTP server that serves synthetic RSS/Atom feeds and article pages,
+generates throwaway databases of different sizes and times the ingestion, listing,
+read-queue, search and delete paths of BriefShell against them.
+
+    python3 bench.py --sizes 1000,10000,100000 --latency-ms 20
+"""
+import argparse
+import contextlib
+import datetime
+import email.utils
+import http.server
+import io
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import time
+
+import brief
+
+# --- synthetic content ---
+WORDS = ("market policy river energy school budget garden science vote harbor museum storm "
+         "council festival railway climate library startup orchard summit bridge election").split()
+
+def sentence(rng, words=14):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+def article_text(seed, paragraphs):
+    rng = random.Random(seed)
+    return "\n\n".join(" ".join(sentence(rng) for _ in range(4)) for _ in range(paragraphs))
+
+def article_html(feed, entry, paragraphs):
+    body = "".join(f"<p>{p}</p>" for p in article_text(feed * 100003 + entry, paragraphs).split("\n\n"))
+    return (f"<html><head><title>Story {feed}-{entry}</title>"
+            f"<meta property='article:published_time' content='{iso_stamp(feed, entry)}'></head>"
+            f"<body><article><h1>Story {feed}-{entry}</h1>{body}</article></body></html>")
+
+def entry_stamp(feed, entry):
+    return 1700000000 + feed * 7919 + entry * 3600
+
+def iso_stamp(feed, entry):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(entry_stamp(feed, entry)))
+
+def feed_xml(host, feed, entries):
+    # Even feeds are RSS 2.0, odd feeds Atom, newest entry first
+    if feed % 2 == 0:
+        items = "".join(
+            f"<item><title>Story {feed}-{m}</title><link>http://{host}/article/{feed}/{m}.html</link>"
+            f"<guid>{feed}-{m}</guid><pubDate>{email.utils.formatdate(entry_stamp(feed, m), usegmt=True)}</pubDate></item>"
+            for m in range(entries, 0, -1))
+        return (f'<?xml version="1.0"?><rss version="2.0"><channel><title>Feed {feed}</title>'
+                f"<link>http://{host}/</link><description>Synthetic feed</description>{items}</channel></rss>")
+    items = "".join(
+        f"<entry><title>Story {feed}-{m}</title><link href='http://{host}/article/{feed}/{m}.html'/>"
+        f"<id>urn:brief:{feed}-{m}</id><updated>{iso_stamp(feed, m)}</updated></entry>"
+        for m in range(entries, 0, -1))
+    return (f'<?xml version="1.0" encoding="utf-8"?><feed xmlns="http://www.w3.org/2005/Atom">'
+            f"<title>Feed {feed}</title><id>urn:brief:{feed}</id><updated>{iso_stamp(feed, entries)}</updated>{items}</feed>")
+
+
+# --- stand-in server ---
+def serve(address, latency, entries, paragraphs, ready):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(latency)
+            parts = self.path.strip("/").split("/")
+            try:
+                if parts[0] == "feed":
+                    body, content_type = feed_xml(self.headers["Host"], int(parts[1].split(".")[0]), entries), "application/xml"
+                elif parts[0] == "article":
+                    body, content_type = article_html(int(parts[1]), int(parts[2].split(".")[0]), paragraphs), "text/html; charset=utf-8"
+                else:
+                    raise ValueError(self.path)
+            except (ValueError, IndexError):
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = http.server.ThreadingHTTPServer((address, 0), Handler)
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+def start_servers(hosts, latency, entries, paragraphs):
+    """One server per loopback address, so the fetch pool sees `hosts` different hosts"""
+    addresses = []
+    for n in range(hosts):
+        address = f"127.0.0.{n + 1}"
+        try:
+            with socket.socket() as probe:
+                probe.bind((address, 0))
+        except OSError:
+            # Only 127.0.0.1 is usable on this system
+            address = "127.0.0.1"
+        if address not in addresses:
+            addresses.append(address)
+    ready = multiprocessing.Queue()
+    processes = []
+    endpoints = []
+    for address in addresses:
+        process = multiprocessing.Process(target=serve, args=(address, latency, entries, paragraphs, ready), daemon=True)
+        process.start()
+        processes.append(process)
+        endpoints.append(f"{address}:{ready.get(timeout=10)}")
+    return processes, endpoints
+
+
+# --- measurements ---
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+def result(scenario, size, samples, elapsed=None, unit="op"):
+    elapsed = sum(samples) if elapsed is None else elapsed
+    return {"scenario": scenario, "size": size, "ops": len(samples), "unit": unit, "seconds": elapsed,
+            "throughput": len(samples) / elapsed if elapsed else 0.0,
+            "p50": percentile(samples, 0.5) if samples else 0.0, "p99": percentile(samples, 0.99) if samples else 0.0}
+
+def summary(scenario, size, ops, elapsed, unit="op"):
+    return {"scenario": scenario, "size": size, "ops": ops, "unit": unit, "seconds": elapsed,
+            "throughput": ops / elapsed if elapsed else 0.0, "p50": None, "p99": None}
+
+def timed(func, *args):
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+def open_shell(path):
+    brief.DB_FILENAME = path
+    return brief.BriefShell()
+
+def generate_database(path, size, paragraphs, hosts=20):
+    shell = open_shell(path)
+    c = shell.conn.cursor()
+    rng = random.Random(size)
+    texts = [article_text(n, paragraphs) for n in range(50)]
+    for start in range(0, size, 1000):
+        articles, bodies = [], []
+        for n in range(start, min(start + 1000, size)):
+            host = f"www.site{n % hosts}.example"
+            day = 1700000000 + rng.randrange(0, 3 * 365 * 86400)
+            source = f"https://{host}/feed.xml"
+            articles.append((n + 1, f"https://{host}/story/{n}", f"Story {n}: {sentence(rng, 6)}", source,
+                             *brief.BriefShell.listing_metadata(source, datetime.datetime(*time.gmtime(day)[:6]))))
+            bodies.append((n + 1, *brief.pack_body(texts[n % len(texts)])))
+        c.executemany("INSERT INTO article (id, url, title, source, site, publish_date, publish_ts, display_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", articles)
+        c.executemany("INSERT INTO article_body (article_id, codec, raw_size, body) VALUES (?, ?, ?, ?)", bodies)
+    shell.conn.commit()
+    return shell
+
+def quietly(shell, line):
+    with contextlib.redirect_stdout(io.StringIO()):
+        shell.onecmd(line)
+
+def bench_ingest(directory, endpoints, feeds, entries):
+    shell = open_shell(os.path.join(directory, "ingest.db"))
+    for n in range(feeds):
+        shell.conn.execute("INSERT INTO rss_feeds (url) VALUES (?)", (f"http://{endpoints[n % len(endpoints)]}/feed/{n}.xml",))
+    shell.conn.commit()
+    brief.metrics.reset()
+    started = time.perf_counter()
+    results = shell.fetch_feeds(shell.select_feeds(["*"]), entries, report=lambda message: None)
+    elapsed = time.perf_counter() - started
+    shell.reader.close()
+    shell.conn.close()
+    saved = sum(1 for r in results if r["status"] == "saved")
+    rows = [summary("ingest", feeds * entries, saved, elapsed, "article")]
+    for stage, timing in brief.metrics.snapshot()["stages"].items():
+        if stage.startswith(("feed.", "article.", "db.")):
+            rows.append({"scenario": f"ingest:{stage}", "size": feeds * entries, "ops": timing["count"], "unit": "op",
+                         "seconds": timing["total"], "throughput": timing["count"] / timing["total"] if timing["total"] else 0.0,
+                         "p50": timing["p50"], "p99": timing["p99"]})
+    return rows
+
+def bench_database(directory, size, paragraphs, pages, reads, deletes):
+    path = os.path.join(directory, f"bench-{size}.db")
+    started = time.perf_counter()
+    shell = generate_database(path, size, paragraphs)
+    rows = [summary("generate", size, size, time.perf_counter() - started, "article")]
+    rng = random.Random(size)
+
+    # Paging through `article list` the way the shell does
+    samples = [timed(quietly, shell, "article list --limit 20")]
+    samples += [timed(quietly, shell, "article list --page") for _ in range(pages - 1)]
+    rows.append(result("list:page", size, samples))
+
+    started = time.perf_counter()
+    count = sum(1 for _ in shell.iter_articles())
+    rows.append(summary("list:full", size, count, time.perf_counter() - started, "row"))
+
+    samples = [timed(quietly, shell, f"article list --source site{n % 20}.example --limit 20") for n in range(pages)]
+    rows.append(result("list:source", size, samples))
+
+    # The database side of `article read`: number -> row -> decompressed body
+    def read_one(ordinal):
+        found = shell.resolve_ordinals("article", [ordinal], conn=shell.reader)
+        for row in found.values():
+            shell.load_body(row["id"])
+    samples = [timed(read_one, rng.randint(1, size)) for _ in range(reads)]
+    rows.append(result("read:queue", size, samples))
+
+    samples = [timed(quietly, shell, f"article search {rng.choice(WORDS)} {rng.choice(WORDS)}") for _ in range(pages)]
+    rows.append(result("search", size, samples))
+
+    ids = rng.sample(range(1, size + 1), min(size, deletes * 100))
+    samples = [timed(shell.delete_ids, "article", ids[n:n + 100]) for n in range(0, len(ids), 100)]
+    rows.append(result("delete:100", size, samples))
+    shell.reader.close()
+    shell.conn.close()
+    return rows
+
+
+# --- report ---
+def format_seconds(seconds):
+    if seconds is None:
+        return "-"
+    return f"{seconds * 1000:.2f}ms" if seconds < 1 else f"{seconds:.2f}s"
+
+def print_table(rows):
+    print(f"{'scenario':<24} {'size':>7} {'ops':>7} {'total':>10} {'throughput':>14} {'p50':>10} {'p99':>10}")
+    for row in rows:
+        throughput = f"{row['throughput']:.1f} {row['unit']}/s"
+        print(f"{row['scenario']:<24} {row['size']:>7} {row['ops']:>7} {format_seconds(row['seconds']):>10} "
+              f"{throughput:>14} {format_seconds(row['p50']):>10} {format_seconds(row['p99']):>10}")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark brief against a local stand-in server and generated databases")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="database sizes in articles (default 1000,10000,100000)")
+    parser.add_argument("--feeds", type=int, default=20, help="feeds to ingest (default 20)")
+    parser.add_argument("--entries", type=int, default=10, help="entries fetched per feed (default 10)")
+    parser.add_argument("--hosts", type=int, default=4, help="distinct loopback hosts serving the feeds (default 4)")
+    parser.add_argument("--latency-ms", type=float, default=20, help="server delay per request (default 20)")
+    parser.add_argument("--paragraphs", type=int, default=12, help="paragraphs per article (default 12)")
+    parser.add_argument("--pages", type=int, default=50, help="list pages and searches per size (default 50)")
+    parser.add_argument("--reads", type=int, default=200, help="articles loaded for the read queue (default 200)")
+    parser.add_argument("--deletes", type=int, default=10, help="batches of 100 articles deleted (default 10)")
+    parser.add_argument("--skip-ingest", action="store_true", help="only benchmark the generated databases")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per result")
+    parser.add_argument("--keep", action="store_true", help="keep the generated databases and print where they are")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    directory = tempfile.mkdtemp(prefix="brief-bench-")
+    processes = []
+    rows = []
+    try:
+        if not args.skip_ingest:
+            processes, endpoints = start_servers(args.hosts, args.latency_ms / 1000, args.entries, args.paragraphs)
+            rows += bench_ingest(directory, endpoints, args.feeds, args.entries)
+        for size in sizes:
+            rows += bench_database(directory, size, args.paragraphs, args.pages, args.reads, args.deletes)
+    finally:
+        for process in processes:
+            process.terminate()
+        if args.keep:
+            print(f"Databases kept in {directory}", file=sys.stderr)
+        else:
+            shutil.rmtree(directory, ignore_errors=True)
+    if args.json:
+        for row in rows:
+            print(json.dumps(row))
+    else:
+        print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,16 +3,33 @@ import sqlite3
 import subprocess
 import tempfile
 import os
-from urllib.parse import urlparse
+from urllib.parse import urlparse, urlsplit, urlunsplit, unquote_plus
 import re
 import sys
 import itertools
 import importlib.util
 import datetime
-from dateutil import parser as dateutil_parser
+import collections
+import concurrent.futures
+import threading
+import hashlib
+import gzip
+import zlib
+import shutil
+import argparse
+import json
+import time
+import random
+import calendar
+import signal
+import bisect
+import contextlib
+import pathlib
+import email.utils
 
 
-PIP_PACKAGE_TO_MODULE = {"feedparser": "feedparser", "newspaper3k": "newspaper", "lxml_html_clean": "lxml_html_clean",  "pyyaml": "yaml", "cssselect": "cssselect", "Pillow": "PIL", "python-dateutil": "dateutil"}
+DEPENDENCY_STAMP = os.path.expanduser("~/.cache/brief/dependencies")
+PIP_PACKAGE_TO_MODULE = {"feedparser": "feedparser", "newspaper3k": "newspaper", "requests": "requests", "lxml_html_clean": "lxml_html_clean",  "pyyaml": "yaml", "cssselect": "cssselect", "Pillow": "PIL", "python-dateutil": "dateutil", "aiohttp": "aiohttp"}
 
 def check_apt_dependencies(packages):
     missing = []
@@ -30,9 +47,21 @@ def check_pip_dependencies(packages):
             missing.append(pkg)
     return missing
 
+def dependency_check_key(apt_packages, pip_packages):
+    return hashlib.sha256("\0".join([sys.executable] + apt_packages + pip_packages).encode("utf-8")).hexdigest()
+
 def install_packages():
     apt_packages = ["git", "festival", "xsel","python3-pip", "libxml2-dev", "libxslt1-dev", "python3-dev", "libjpeg-dev", "zlib1g-dev", "build-essential", "python3-gi", "python3-gi-cairo", "gir1.2-gtk-4.0"]
-    pip_packages = ["feedparser","newspaper3k", "lxml_html_clean", "pyyaml", "cssselect", "Pillow", "python-dateutil"]
+    pip_packages = ["feedparser","newspaper3k", "requests", "lxml_html_clean", "pyyaml", "cssselect", "Pillow", "python-dateutil", "aiohttp"]
+
+    # A previous run with this interpreter already found everything installed
+    key = dependency_check_key(apt_packages, pip_packages)
+    try:
+        with open(DEPENDENCY_STAMP) as f:
+            if f.read().strip() == key:
+                return
+    except OSError:
+        pass
 
     missing_apt = check_apt_dependencies(apt_packages)
     if missing_apt:
@@ -63,46 +92,1398 @@ def install_packages():
             print("Cannot continue without required pip packages")
             sys.exit(1)
 
-import feedparser
-from newspaper import Article
+    try:
+        os.makedirs(os.path.dirname(DEPENDENCY_STAMP), exist_ok=True)
+        with open(DEPENDENCY_STAMP, "w") as f:
+            f.write(key)
+    except OSError:
+        pass
+
+# --- metrics ---
+METRIC_BUCKETS = [0.0005 * 2 ** i for i in range(22)]
+PROFILE_TOP = 25
+
+class Metrics:
+    """Per-stage counters and latency histograms for this process
+
+    Latencies go into power-of-two buckets from 0.5ms to about 30 minutes, so
+    percentiles are approximate but recording is cheap and thread-safe"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = collections.Counter()
+        self.timings = {}
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.timings.clear()
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    def record(self, stage, seconds):
+        with self.lock:
+            timing = self.timings.get(stage)
+            if timing is None:
+                timing = self.timings[stage] = {"count": 0, "total": 0.0, "max": 0.0, "buckets": [0] * (len(METRIC_BUCKETS) + 1)}
+            timing["count"] += 1
+            timing["total"] += seconds
+            timing["max"] = max(timing["max"], seconds)
+            timing["buckets"][bisect.bisect_left(METRIC_BUCKETS, seconds)] += 1
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    @staticmethod
+    def percentile(timing, fraction):
+        rank = fraction * timing["count"]
+        seen = 0
+        for bound, n in zip(METRIC_BUCKETS, timing["buckets"]):
+            seen += n
+            if seen >= rank:
+                return min(bound, timing["max"])
+        return timing["max"]
+
+    def snapshot(self):
+        with self.lock:
+            stages = {}
+            for stage, timing in sorted(self.timings.items()):
+                stages[stage] = {"count": timing["count"], "total": timing["total"], "mean": timing["total"] / timing["count"],
+                                 "p50": self.percentile(timing, 0.5), "p90": self.percentile(timing, 0.9),
+                                 "p99": self.percentile(timing, 0.99), "max": timing["max"]}
+            return {"counters": dict(sorted(self.counters.items())), "stages": stages}
+
+    def write(self, path, command=None):
+        """Append the current snapshot to `path` as one JSON line"""
+        line = {"time": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"), "command": command, **self.snapshot()}
+        with open(path, "a") as f:
+            f.write(json.dumps(line) + "\n")
+
+metrics = Metrics()
+
+
+# --- FetchPool ---
+FETCH_WORKERS = 8
+FETCH_PER_HOST = 2
+
+class FetchPool:
+    """Bounded thread pool for network jobs with a per-host concurrency limit
+
+    Jobs are queued and their results consumed on the calling thread, so all
+    database work stays on a single writer"""
+    def __init__(self, workers=FETCH_WORKERS, per_host=FETCH_PER_HOST):
+        self.workers = workers
+        self.per_host = per_host
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self.waiting = collections.deque()
+        self.active = {}
+        self.host_counts = collections.Counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.waiting.clear()
+        for job in self.active:
+            job.cancel()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def submit(self, url, func, *args, tag=None):
+        host = urlparse(url).hostname or ""
+        self.waiting.append((host, func, args, tag))
+        self.dispatch()
+
+    def dispatch(self):
+        held = collections.deque()
+        while self.waiting and len(self.active) < self.workers:
+            host, func, args, tag = self.waiting.popleft()
+            if self.host_counts[host] >= self.per_host:
+                held.append((host, func, args, tag))
+                continue
+            self.host_counts[host] += 1
+            self.active[self.executor.submit(func, *args)] = (host, tag)
+        held.extend(self.waiting)
+        self.waiting = held
+
+    def complete(self, job):
+        host, tag = self.active.pop(job)
+        self.host_counts[host] -= 1
+        self.dispatch()
+        return tag
+
+    def results(self):
+        while self.active:
+            done, _ = concurrent.futures.wait(self.active, return_when=concurrent.futures.FIRST_COMPLETED)
+            for job in done:
+                yield self.complete(job), job
+
+
+# --- ingest ---
+EXTRACT_WORKERS = os.cpu_count() or 2
+EXTRACT_QUEUE_SIZE = 16
+
+def extraction_pool(workers=EXTRACT_WORKERS, start_method="fork"):
+    import multiprocessing
+    context = multiprocessing.get_context(start_method) if start_method in multiprocessing.get_all_start_methods() else None
+    pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    # Start the processes now, before any download thread exists to be forked
+    pool.submit(int).result()
+    return pool
+
+ASYNC_CONCURRENCY = 64
+FETCH_DEADLINE = 10 * 60
+
+IngestEvent = collections.namedtuple("IngestEvent", "kind feed url message")
+
+class FetchRun:
+    """State shared by the feeds of one Ingestor.fetch_feeds() call"""
+    def __init__(self, per_feed):
+        self.per_feed = per_feed
+        self.results = []
+        self.pending_feeds = {}
+        self.in_flight = {}
+        self.queued = set()
+        self.newest = {}
+
+class Ingestor:
+    """Asyncio ingestion engine: the API behind `rss fetch`, `url add` and the daemon
+
+    Feeds and pages are downloaded concurrently on one event loop (at most `concurrency`
+    requests and `per_host` per host) with aiohttp, or with the shared requests client on
+    a few threads if aiohttp has not been installed yet. newspaper extraction runs on a process
+    pool: pass your own executor as `extractor` (with `extract_workers` workers), or let
+    the Ingestor start one with `start_method` ("forkserver" by default, since forking a
+    process that already runs threads is unsafe; brief's own shell uses "fork"). Database
+    writes go through `shell` on the loop's thread, so create the shell on that thread
+    too. Retention is left to the caller (BriefShell.enforce_retention).
+
+    Progress is passed to `on_event` as IngestEvent(kind, feed, url, message) tuples,
+    where `feed` is the feed's list number (or None) and `kind` is one of feed_start,
+    feed_skipped, feed_unchanged, feed_failed, feed_disabled, feed_done, article_exists,
+    article_saved, article_duplicate, article_failed or deadline. The coroutines return
+    one result dict per article (and per failed or skipped feed).
+
+        async with Ingestor(BriefShell(), on_event=queue.put_nowait) as ingestor:
+            results = await ingestor.fetch_feeds(None, per_feed=10)
+    """
+    def __init__(self, shell, on_event=None, concurrency=ASYNC_CONCURRENCY, per_host=FETCH_PER_HOST,
+                 extract_workers=EXTRACT_WORKERS, queue_size=EXTRACT_QUEUE_SIZE, extractor=None, start_method="forkserver"):
+        self.shell = shell
+        self.on_event = on_event
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.extract_workers = extract_workers
+        self.queue_size = queue_size
+        self.extractor = extractor
+        self.owns_extractor = extractor is None
+        self.start_method = start_method
+
+    async def __aenter__(self):
+        import asyncio
+        if self.owns_extractor and self.start_method == "fork":
+            # Fork right away, before this process starts any thread of its own
+            self.extractor = extraction_pool(self.extract_workers, "fork")
+        elif self.owns_extractor:
+            # Starting fresh worker processes takes a while; don't hold up the caller's loop
+            self.extractor = await asyncio.get_running_loop().run_in_executor(
+                None, extraction_pool, self.extract_workers, self.start_method)
+        self.threads = concurrent.futures.ThreadPoolExecutor(max_workers=FETCH_WORKERS)
+        self.http = AsyncHttpClient(self.threads, self.concurrency, self.per_host)
+        self.requests = asyncio.Semaphore(self.concurrency)
+        self.hosts = collections.defaultdict(lambda: asyncio.Semaphore(self.per_host))
+        # Pages waiting for (or in) extraction; downloads pause while these are taken
+        self.extract_slots = asyncio.Semaphore(self.extract_workers + self.queue_size)
+        self.abandoned = False
+        self.flush_scheduled = False
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abandoned = True
+        await self.http.close()
+        # Abandoned downloads are left to run out their HTTP timeout in the background
+        self.threads.shutdown(wait=not self.abandoned, cancel_futures=True)
+        if self.owns_extractor:
+            self.extractor.shutdown(wait=not self.abandoned, cancel_futures=True)
+            self.extractor = None
+
+    def defer_flush(self):
+        # Runs before the loop polls for I/O again, so no write transaction waits on the network
+        if not self.flush_scheduled:
+            import asyncio
+            self.flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self.flush)
+
+    def flush(self):
+        self.flush_scheduled = False
+        self.shell.flush()
+
+    def emit(self, kind, message, feed=None, url=None):
+        if self.on_event:
+            self.on_event(IngestEvent(kind, feed['ordinal'] if feed else None, url, message))
+
+    @contextlib.asynccontextmanager
+    async def slot(self, url):
+        async with self.hosts[urlsplit(url).hostname or ""], self.requests:
+            yield
+
+    async def download_feed(self, feed):
+        import asyncio
+        async with self.slot(feed['url']):
+            started = time.monotonic()
+            response = await self.http.get(feed['url'], conditional_headers(feed['etag'], feed['last_modified']))
+            latency = time.monotonic() - started
+        # feedparser is pure Python; parse on a thread so other downloads keep moving
+        return await asyncio.get_running_loop().run_in_executor(
+            self.threads, read_feed, response, latency, feed['etag'], feed['last_modified'], feed['content_hash'])
+
+    async def extract(self, url):
+        """Download one page and run it through newspaper; returns an ExtractedArticle"""
+        import asyncio
+        async with self.slot(url):
+            # Wait for room in the extraction queue only once the host is free, so pages
+            # queued behind a busy host don't hold up downloads from the others
+            await self.extract_slots.acquire()
+            try:
+                started = time.monotonic()
+                response = await self.http.get(url)
+                response.raise_for_status()
+                html = decode_html(response)
+                metrics.record("article.download", time.monotonic() - started)
+            except BaseException:
+                self.extract_slots.release()
+                raise
+        try:
+            metrics.count("bytes.html", len(response.content))
+            article = await asyncio.get_running_loop().run_in_executor(self.extractor, extract_article, url, html)
+        finally:
+            self.extract_slots.release()
+        metrics.record("article.extract", article.elapsed)
+        return article
+
+    def store(self, article, url, source, published, feed=None):
+        """Save an extracted article unless it duplicates a saved one; returns its result dict"""
+        result = {"feed": feed['ordinal']} if feed else {}
+        result["url"] = url
+        try:
+            duplicate = self.shell.find_duplicate(article)
+            if duplicate and (duplicate[2] == "same canonical URL" or self.shell.duplicate_policy == "skip"):
+                self.emit("article_duplicate", f"Skipped duplicate ({duplicate[2]}) of: {duplicate[1]}", feed, url)
+                return {**result, "status": "duplicate", "duplicate_of": duplicate[0], "title": article.title}
+            article_id = self.shell.save_article(article.canonical_url or url, article, source, published,
+                                                 duplicate[0] if duplicate else None)
+        except Exception as e:
+            metrics.count("articles.failed")
+            self.emit("article_failed", f"Failed to parse article {url}: {e}", feed, url)
+            return {**result, "status": "failed", "error": str(e)}
+        self.emit("article_saved", f"Saved article: {article.title}", feed, url)
+        return {**result, "status": "saved", "id": article_id, "title": article.title}
+
+    async def add_url(self, url):
+        """Download, extract and save the article at `url`; returns its result dict"""
+        # The canonical form is only the key for spotting duplicates; the page itself comes from the URL as given
+        link, url = url.strip(), canonical_url(url)
+        if self.shell.article_exists(url):
+            self.emit("article_exists", f"Already have article: {url}", url=url)
+            return {"url": url, "status": "exists"}
+        try:
+            article = await self.extract(link)
+        except ImportError:
+            raise
+        except Exception as e:
+            metrics.count("articles.failed")
+            self.emit("article_failed", f"Failed to parse article {url}: {e}", url=url)
+            return {"url": url, "status": "failed", "error": str(e)}
+        return self.store(article, url, article.canonical_url or url, self.shell.parse_publish_date(article))
+
+    async def fetch_feeds(self, feed_ids=None, per_feed=10, deadline=FETCH_DEADLINE, skip_disabled=True):
+        """Fetch up to `per_feed` new articles from each feed (internal IDs; None for every feed)
+
+        The run gives up after `deadline` seconds. Feeds disabled after repeated failures are
+        skipped unless `skip_disabled` is False."""
+        import asyncio
+        run = FetchRun(per_feed)
+        tasks = []
+        now = time.time()
+        with self.shell.write_batch(deferred=self.defer_flush):
+            for feed in self.shell.feeds_by_id(feed_ids):
+                if skip_disabled and feed['disabled_until'] and feed['disabled_until'] > now:
+                    self.emit("feed_skipped", f"Skipping feed ID {feed['ordinal']}: disabled until {self.shell.format_timestamp(feed['disabled_until'])} after {feed['failure_count']} failures in a row", feed, feed['url'])
+                    run.results.append({"feed": feed['ordinal'], "url": feed['url'], "status": "feed_disabled"})
+                    continue
+                self.emit("feed_start", f"Fetching {per_feed} entries from feed ID {feed['ordinal']}: {feed['url']}", feed, feed['url'])
+                run.pending_feeds[feed['id']] = feed
+                tasks.append(asyncio.ensure_future(self.fetch_feed(feed, run)))
+            if tasks:
+                done, pending = await asyncio.wait(tasks, timeout=deadline or None)
+                if pending:
+                    self.abandoned = True
+                    for task in pending:
+                        task.cancel()
+                    await asyncio.wait(pending)
+                    self.give_up(run, deadline)
+                for task in done:
+                    task.result()
+        return run.results
+
+    def give_up(self, run, deadline):
+        self.emit("deadline", f"Stopped after the {deadline}s fetch deadline")
+        for feed in run.pending_feeds.values():
+            self.fail_feed(feed, "timed out (fetch deadline)", run)
+        for url, feed in run.in_flight.items():
+            self.emit("article_failed", f"Gave up on article {url}", feed, url)
+            run.results.append({"feed": feed['ordinal'], "url": url, "status": "failed", "error": "timed out (fetch deadline)"})
+        # Leave the validators and high-water mark alone so the next run picks these entries up
+        for feed in {feed['id']: feed for feed in run.in_flight.values()}.values():
+            self.shell.record_failed_entries(feed['id'], sum(1 for result in run.results
+                                                              if result['feed'] == feed['ordinal'] and result['status'] == "failed"))
+            self.shell.schedule_next_poll(feed)
+
+    def fail_feed(self, feed, error, run):
+        metrics.count("feeds.failed")
+        self.emit("feed_failed", f"Failed to fetch feed {feed['url']}: {error}", feed, feed['url'])
+        run.results.append({"feed": feed['ordinal'], "url": feed['url'], "status": "feed_failed", "error": error})
+        disabled_until = self.shell.record_feed_failure(feed, error)
+        if disabled_until:
+            self.emit("feed_disabled", f"Feed ID {feed['ordinal']} disabled until {self.shell.format_timestamp(disabled_until)} after {(feed['failure_count'] or 0) + 1} failures in a row", feed, feed['url'])
+
+    def mark_seen(self, feed, entry, run):
+        self.shell.mark_entry_seen(feed['id'], self.shell.entry_key(entry))
+        entry_date = self.shell.entry_date(entry)
+        if entry_date and entry_date > (run.newest.get(feed['id']) or ""):
+            run.newest[feed['id']] = entry_date
+
+    async def fetch_feed(self, feed, run):
+        import asyncio
+        try:
+            result = await self.download_feed(feed)
+        except ImportError:
+            # A missing local package is not the feed's fault; let the caller report it
+            raise
+        except Exception as e:
+            del run.pending_feeds[feed['id']]
+            self.fail_feed(feed, str(e), run)
+            return
+        del run.pending_feeds[feed['id']]
+        self.shell.record_feed_success(feed, result.latency)
+        if result.parsed is None:
+            self.shell.store_validators(feed, result)
+            self.shell.schedule_next_poll(feed)
+            self.emit("feed_unchanged", f"Feed ID {feed['ordinal']} has not changed since the last fetch", feed, feed['url'])
+            return
+        entries = [e for e in result.parsed.entries[:run.per_feed] if self.shell.entry_key(e)]
+        seen = self.shell.seen_entries(feed['id'], [self.shell.entry_key(e) for e in entries])
+        jobs = []
+        for entry in entries:
+            if self.shell.entry_key(entry) in seen:
+                entry_date = self.shell.entry_date(entry)
+                # Entries that failed last time can be older than the high-water mark, so look at everything until they are in
+                if entry_date and feed['newest_entry_date'] and entry_date <= feed['newest_entry_date'] and not feed['failed_entries']:
+                    break
+                continue
+            url = canonical_url(entry['link']) if entry.get('link') else None
+            if not url or url in run.queued:
+                continue
+            if self.shell.article_exists(url):
+                self.emit("article_exists", f"Already have article: {url}", feed, url)
+                self.mark_seen(feed, entry, run)
+                continue
+            run.queued.add(url)
+            jobs.append(self.fetch_article(feed, entry, url, run))
+        statuses = await asyncio.gather(*jobs)
+        saved = statuses.count("saved")
+        if run.newest.get(feed['id'], "") > (feed['newest_entry_date'] or ""):
+            self.shell.update_newest_entry(feed['id'], run.newest[feed['id']])
+        if statuses.count("failed") != feed['failed_entries']:
+            self.shell.record_failed_entries(feed['id'], statuses.count("failed"))
+        # Keep the old validators while an article failed, or the next fetch would see an
+        # unchanged feed and never get back to it
+        if "failed" not in statuses:
+            self.shell.store_validators(feed, result)
+        self.shell.schedule_next_poll(feed, result.parsed, saved)
+        if saved == 0:
+            self.emit("feed_done", f"No new articles were added for feed ID {feed['ordinal']}", feed, feed['url'])
+        else:
+            self.emit("feed_done", f"Finished fetching {saved} new articles for feed ID {feed['ordinal']}.", feed, feed['url'])
+
+    async def fetch_article(self, feed, entry, url, run):
+        """Fetch, extract and store one feed entry, keyed by its canonical `url`; returns its result status"""
+        run.in_flight[url] = feed
+        try:
+            # Download the link the feed gave; its canonical form may not be a page of its own (e.g. a stripped /amp)
+            article = await self.extract(entry['link'].strip())
+        except ImportError:
+            raise
+        except Exception as e:
+            del run.in_flight[url]
+            metrics.count("articles.failed")
+            self.emit("article_failed", f"Failed to parse article {url}: {e}", feed, url)
+            run.results.append({"feed": feed['ordinal'], "url": url, "status": "failed", "error": str(e)})
+            return "failed"
+        del run.in_flight[url]
+        result = self.store(article, url, feed['url'], self.shell.parse_publish_date(entry), feed)
+        run.results.append(result)
+        if result['status'] != "failed":
+            self.mark_seen(feed, entry, run)
+        return result['status']
+
+
+# --- http ---
+HTTP_CONNECT_TIMEOUT = 10
+HTTP_TIMEOUT = 30
+HTTP_POOL_HOSTS = 32
+USER_AGENT = "Mozilla/5.0 (compatible; brief RSS reader)"
+META_CHARSET = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.IGNORECASE)
+
+class HttpClient:
+    """Keep-alive HTTP session shared by every fetch thread
+
+    urllib3 keeps a connection pool per host, so consecutive feed and article
+    requests to the same publisher reuse a connection instead of paying for a
+    new TCP/TLS handshake each time"""
+    def __init__(self, timeout=HTTP_TIMEOUT, user_agent=USER_AGENT, hosts=HTTP_POOL_HOSTS, per_host=FETCH_WORKERS):
+        import requests
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=hosts, pool_maxsize=per_host)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        encodings = "gzip, deflate"
+        # urllib3 only decodes brotli when one of these is installed
+        if importlib.util.find_spec("brotli") or importlib.util.find_spec("brotlicffi"):
+            encodings += ", br"
+        self.session.headers.update({"User-Agent": user_agent, "Accept-Encoding": encodings})
+
+    def get(self, url, headers=None):
+        # The read timeout bounds every wait on the socket, so a stalled server can't hang a worker
+        return self.session.get(url, headers=headers, timeout=(min(HTTP_CONNECT_TIMEOUT, self.timeout), self.timeout))
+
+    def close(self):
+        self.session.close()
+
+shared_http_client = None
+shared_http_lock = threading.Lock()
+
+def http_client():
+    global shared_http_client
+    with shared_http_lock:
+        if shared_http_client is None:
+            shared_http_client = HttpClient()
+        return shared_http_client
+
+def configure_http(timeout=HTTP_TIMEOUT, user_agent=USER_AGENT):
+    global shared_http_client
+    with shared_http_lock:
+        if shared_http_client is not None:
+            shared_http_client.close()
+        shared_http_client = HttpClient(timeout, user_agent)
+
+class HttpResponse:
+    """The parts of a requests.Response brief reads, for pages fetched with aiohttp"""
+    def __init__(self, url, status_code, reason, headers, content, charset):
+        self.url = url
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+        self.charset = charset
+
+    @property
+    def text(self):
+        try:
+            return self.content.decode(self.charset or "utf-8", errors="replace")
+        except LookupError:
+            return self.content.decode("utf-8", errors="replace")
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise OSError(f"{self.status_code} {self.reason} for url: {self.url}")
+
+class AsyncHttpClient:
+    """Non-blocking GETs for the Ingestor
+
+    Uses an aiohttp session with the shared client's timeout and User-Agent when
+    aiohttp is installed, and otherwise runs the shared requests client on `threads`.
+    Create it inside the running event loop."""
+    def __init__(self, threads, concurrency, per_host):
+        self.threads = threads
+        self.session = None
+        if importlib.util.find_spec("aiohttp"):
+            import aiohttp
+            client = http_client()
+            self.session = aiohttp.ClientSession(
+                headers={"User-Agent": client.session.headers["User-Agent"]},
+                timeout=aiohttp.ClientTimeout(sock_connect=min(HTTP_CONNECT_TIMEOUT, client.timeout), sock_read=client.timeout),
+                connector=aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host))
+
+    async def get(self, url, headers=None):
+        if self.session is None:
+            import asyncio
+            return await asyncio.get_running_loop().run_in_executor(self.threads, http_client().get, url, headers)
+        async with self.session.get(url, headers=headers) as response:
+            content = await response.read()
+            return HttpResponse(str(response.url), response.status, response.reason, response.headers, content, response.charset)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+def decode_html(response):
+    """Decode a page using the HTTP charset, then <meta charset>, then UTF-8"""
+    if "charset" in response.headers.get("Content-Type", "").lower():
+        return response.text
+    match = META_CHARSET.search(response.content[:4096])
+    if match:
+        try:
+            return response.content.decode(match.group(1).decode("ascii"), errors="replace")
+        except LookupError:
+            pass
+    try:
+        return response.content.decode("utf-8")
+    except UnicodeDecodeError:
+        return response.text
+
+
+FeedResult = collections.namedtuple("FeedResult", "parsed etag last_modified content_hash latency")
+
+def conditional_headers(etag=None, last_modified=None):
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+def download_feed(url, etag=None, last_modified=None, content_hash=None):
+    """Conditionally GET and parse a feed; `parsed` is None when it has not changed"""
+    started = time.monotonic()
+    response = http_client().get(url, conditional_headers(etag, last_modified))
+    return read_feed(response, time.monotonic() - started, etag, last_modified, content_hash)
+
+def read_feed(response, latency, etag=None, last_modified=None, content_hash=None):
+    """FeedResult for a downloaded feed response, from either HTTP client"""
+    metrics.record("feed.download", latency)
+    if response.status_code == 304:
+        metrics.count("feeds.not_modified")
+        return FeedResult(None, etag, last_modified, content_hash, latency)
+    response.raise_for_status()
+    body = response.content
+    metrics.count("bytes.feeds", len(body))
+    digest = hashlib.sha256(body).hexdigest()
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if digest == content_hash:
+        metrics.count("feeds.not_modified")
+        return FeedResult(None, etag, last_modified, digest, latency)
+    # The body is already decompressed, so don't let feedparser see the encoding
+    response_headers = {k.lower(): v for k, v in response.headers.items() if k.lower() != "content-encoding"}
+    response_headers.setdefault("content-location", response.url)
+    import feedparser
+    with metrics.timer("feed.parse"):
+        parsed = feedparser.parse(body, response_headers=response_headers)
+    return FeedResult(parsed, etag, last_modified, digest, latency)
+
+
+ExtractedArticle = collections.namedtuple("ExtractedArticle", "title text publish_date html elapsed canonical_url fingerprint")
+
+def extract_article(url, html):
+    # Runs in a worker process, so the time comes back with the result instead of going to `metrics`
+    started = time.perf_counter()
+    from newspaper import Article
+    # Without a meta image newspaper would download the page's images to pick one; keep extraction offline
+    article = Article(url, fetch_images=False)
+    article.download(input_html=html)
+    article.parse()
+    canonical = canonical_url(article.canonical_link) if article.canonical_link else None
+    # A canonical link pointing at the site's front page is a template bug, not a duplicate
+    if canonical and urlsplit(canonical).path in ("", "/"):
+        canonical = None
+    return ExtractedArticle(article.title, article.text, article.publish_date, html, time.perf_counter() - started,
+                            canonical, simhash(article.text))
+
+def reextract_article(url, codec, blob):
+    return extract_article(url, unpack_body(codec, blob))
+
+def to_utc(dt):
+    """Naive UTC datetime for `dt`; naive input is taken to be UTC already"""
+    return dt.astimezone(datetime.timezone.utc).replace(tzinfo=None) if dt.tzinfo else dt
+
+def parse_date_string(value):
+    """Parse an RFC 822 or ISO 8601 date directly, leaving dateutil for anything else"""
+    value = value.strip()
+    try:
+        return to_utc(email.utils.parsedate_to_datetime(value))
+    except (TypeError, ValueError, IndexError):
+        pass
+    try:
+        return to_utc(datetime.datetime.fromisoformat(value[:-1] + "+00:00" if value.endswith("Z") else value))
+    except ValueError:
+        pass
+    from dateutil import parser as dateutil_parser
+    return to_utc(dateutil_parser.parse(value))
+
+
+# --- dedup ---
+TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid", "_ga", "ref_src",
+                   "cmpid", "ncid", "soc_src", "soc_trk", "amp", "outputtype", "rss", "at_medium", "at_campaign"}
+TRACKING_PREFIXES = ("utm_", "_hs", "mkt_", "pk_", "__twitter")
+SIMHASH_SHINGLE = 3
+SIMHASH_MIN_WORDS = 30
+SIMHASH_BANDS = 4
+SIMHASH_DISTANCE = 3
+DUPLICATE_POLICY = "skip"
+
+def canonical_url(url):
+    """Normalize an article URL so tracking-parameter and AMP variants of a page compare equal"""
+    url = url.strip()
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return url
+    host = parts.hostname
+    path = parts.path or "/"
+    # AMP caches wrap the publisher URL: google.com/amp/s/example.com/story, example-com.cdn.ampproject.org/c/s/example.com/story
+    amp_prefix = "/amp/" if host in ("google.com", "www.google.com") else "/c/" if host.endswith(".cdn.ampproject.org") else None
+    if amp_prefix and path.startswith(amp_prefix):
+        inner = path[len(amp_prefix):]
+        inner = "https://" + inner[2:] if inner.startswith("s/") else "http://" + inner
+        return canonical_url(inner + (f"?{parts.query}" if parts.query else ""))
+    if path.endswith(".amp.html"):
+        path = path[:-len(".amp.html")] + ".html"
+    elif path.endswith(("/amp", "/amp/")):
+        path = path[:path.rstrip("/").rfind("/") + 1] if path.endswith("/amp/") else path[:-len("/amp")] or "/"
+    netloc = host
+    if parts.port and parts.port != {"http": 80, "https": 443}[parts.scheme]:
+        netloc = f"{host}:{parts.port}"
+    # Drop tracking parameters but keep the other segments byte-for-byte; re-encoding them
+    # could point at a different page (`?p` vs `?p=`, `%20` vs `+`)
+    segments = parts.query.split("&") if parts.query else []
+    kept = [segment for segment in segments if not is_tracking_param(unquote_plus(segment.split("=", 1)[0]).lower())]
+    query = parts.query if len(kept) == len(segments) else "&".join(segment for segment in kept if segment)
+    return urlunsplit((parts.scheme, netloc, path, query, ""))
+
+def is_tracking_param(key):
+    return key in TRACKING_PARAMS or key.startswith(TRACKING_PREFIXES)
+
+def simhash(text):
+    """64-bit SimHash of the text's word 3-shingles as a signed SQLite integer, or None for short texts"""
+    words = re.findall(r"\w+", (text or "").lower())
+    if len(words) < SIMHASH_MIN_WORDS:
+        return None
+    hashes = [hashlib.blake2b(" ".join(words[i:i + SIMHASH_SHINGLE]).encode("utf-8"), digest_size=8).digest()
+              for i in range(len(words) - SIMHASH_SHINGLE + 1)]
+    half = len(hashes) / 2
+    value = 0
+    # Count set bits column by column over the binary strings, which keeps the loop out of Python
+    for column in zip(*(format(int.from_bytes(h, "big"), "064b") for h in hashes)):
+        value = (value << 1) | (column.count("1") > half)
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+def simhash_bands(fingerprint):
+    value = fingerprint & ((1 << 64) - 1)
+    width = 64 // SIMHASH_BANDS
+    return [(value >> (width * band)) & ((1 << width) - 1) for band in range(SIMHASH_BANDS)]
+
+def hamming_distance(a, b):
+    return bin((a ^ b) & ((1 << 64) - 1)).count("1")
+
+def fingerprint_body(codec, body):
+    return simhash(unpack_body(codec, body))
+
+
+# --- body storage ---
+BODY_CODEC = "zstd" if importlib.util.find_spec("zstandard") else "zlib"
+
+def pack_body(text, codec=BODY_CODEC):
+    raw = (text or "").encode("utf-8")
+    if codec == "zstd":
+        import zstandard
+        return codec, len(raw), zstandard.ZstdCompressor(level=10).compress(raw)
+    return "zlib", len(raw), zlib.compress(raw, 9)
+
+def unpack_body(codec, body):
+    if body is None:
+        return None
+    if codec == "zstd":
+        import zstandard
+        raw = zstandard.ZstdDecompressor().decompress(body)
+    elif codec == "zlib":
+        raw = zlib.decompress(body)
+    else:
+        raw = body
+    return raw.decode("utf-8")
+
+def format_size(num_bytes):
+    for unit in ("B", "KB", "MB", "GB"):
+        if num_bytes < 1024 or unit == "GB":
+            return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+
+# --- import/export ---
+def open_ndjson(path, mode="r"):
+    """Open an NDJSON file for reading or writing text; gzip when the name ends in .gz (or the data is gzip, when reading)"""
+    if mode == "w":
+        if path.endswith(".gz"):
+            return gzip.open(path, "wt", encoding="utf-8", compresslevel=1)
+        return open(path, "w", encoding="utf-8")
+    with open(path, "rb") as f:
+        compressed = f.read(2) == b"\x1f\x8b"
+    return gzip.open(path, "rt", encoding="utf-8") if compressed else open(path, encoding="utf-8")
+
+def read_opml(path):
+    """Feed URLs from the outlines of an OPML file, in document order without repeats"""
+    import xml.etree.ElementTree as ET
+    urls = []
+    for _, element in ET.iterparse(path):
+        if element.tag == "outline" and element.get("xmlUrl"):
+            urls.append(element.get("xmlUrl").strip())
+    return list(dict.fromkeys(urls))
+
+def write_opml(urls, out):
+    from xml.sax.saxutils import quoteattr
+    out.write('<?xml version="1.0" encoding="UTF-8"?>\n<opml version="2.0">\n  <head><title>brief feeds</title></head>\n  <body>\n')
+    for url in urls:
+        out.write(f'    <outline type="rss" text={quoteattr(url)} xmlUrl={quoteattr(url)}/>\n')
+    out.write("  </body>\n</opml>\n")
+
+
+# --- speech ---
+AUDIO_CACHE_DIR = os.path.expanduser("~/.cache/brief/audio")
+AUDIO_CACHE_MAX_BYTES = 512 * 1024 * 1024
+TTS_LOOKAHEAD = 1
+TTS_CHUNK_CHARS = 400
+TTS_CHUNK_LOOKAHEAD = 2
+SKIP_PARAGRAPH = 3
+TTS_WORKER_DONE = "brief-tts-done"
+ARTICLE_FILES_MAX = 50
+
+def scheme_string(text):
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+class FestivalWorker:
+    """One long-running `festival --pipe` that renders text to WAV files, one request at a time
+
+    Text goes in over stdin, so there is no process start-up or voice loading per article."""
+    def __init__(self):
+        self.process = subprocess.Popen(["festival", "--pipe"], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL, text=True, encoding="utf-8", errors="replace")
+        self.lock = threading.Lock()
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def render(self, text, speed, path):
+        with self.lock:
+            try:
+                self.process.stdin.write(
+                    f"(Parameter.set 'Duration_Stretch {1 / speed})\n"
+                    f"(utt.save.wave (utt.synth (Utterance Text {scheme_string(text)})) {scheme_string(path)} 'riff)\n"
+                    f'(format t "%s\\n" "{TTS_WORKER_DONE}")\n'
+                    "(fflush nil)\n")
+                self.process.stdin.flush()
+            except (BrokenPipeError, ValueError):
+                raise RuntimeError("festival exited") from None
+            # A failed expression is reported on stderr and skipped, so the marker still arrives
+            for line in self.process.stdout:
+                if TTS_WORKER_DONE in line:
+                    break
+            else:
+                raise RuntimeError("festival exited")
+        if not os.path.exists(path):
+            raise RuntimeError("festival could not synthesize the text")
+
+    def close(self):
+        if self.alive():
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+shared_festival_worker = None
+shared_festival_lock = threading.Lock()
+
+def festival_worker():
+    global shared_festival_worker
+    with shared_festival_lock:
+        if shared_festival_worker is None or not shared_festival_worker.alive():
+            shared_festival_worker = FestivalWorker()
+        return shared_festival_worker
+
+def close_festival_worker():
+    global shared_festival_worker
+    with shared_festival_lock:
+        if shared_festival_worker is not None:
+            shared_festival_worker.close()
+            shared_festival_worker = None
+
+class ArticleFiles:
+    """Article text handed to other programs by path, released after use or at close()
+
+    On Linux the text lives in anonymous memory (memfd) and is reached through /proc, so
+    nothing is written to disk; elsewhere it goes to a private temporary directory."""
+    def __init__(self, max_files=ARTICLE_FILES_MAX):
+        self.max_files = max_files
+        self.files = collections.OrderedDict()
+        self.directory = None
+
+    def add(self, content):
+        data = content.encode("utf-8")
+        if hasattr(os, "memfd_create"):
+            fd = os.memfd_create("brief-article.txt")
+            path = f"/proc/{os.getpid()}/fd/{fd}"
+        else:
+            if self.directory is None:
+                self.directory = tempfile.TemporaryDirectory(prefix="brief-")
+            fd, path = tempfile.mkstemp(suffix=".txt", dir=self.directory.name)
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+        self.files[path] = fd
+        while len(self.files) > self.max_files:
+            self.release(next(iter(self.files)))
+        return path
+
+    def release(self, path):
+        fd = self.files.pop(path, None)
+        if fd is None:
+            return
+        os.close(fd)
+        if not path.startswith("/proc/"):
+            os.remove(path)
+
+    def close(self):
+        for path in list(self.files):
+            self.release(path)
+        if self.directory is not None:
+            self.directory.cleanup()
+            self.directory = None
+
+class AudioCache:
+    """Synthesized speech on disk, keyed by text and playback speed, evicted least recently used first"""
+    def __init__(self, directory=AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.input_conf = os.path.join(directory, "input.conf")
+        if not os.path.exists(self.input_conf):
+            with open(self.input_conf, "w") as f:
+                f.write(f"n quit {SKIP_PARAGRAPH}\n")
+
+    @staticmethod
+    def available():
+        return shutil.which("festival") is not None and shutil.which("mpv") is not None
+
+    def path(self, text, speed):
+        key = hashlib.sha256(f"{speed}\0{text}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{key}.wav")
+
+    def synthesize(self, text, speed):
+        path = self.path(text, speed)
+        if os.path.exists(path):
+            os.utime(path)
+            metrics.count("tts.cache_hits")
+            return path
+        metrics.count("tts.cache_misses")
+        partial = f"{path}.{threading.get_ident()}.part"
+        try:
+            with metrics.timer("tts.synthesize"):
+                festival_worker().render(text, speed, partial)
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        self.evict()
+        return path
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".wav"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def play(self, path):
+        return subprocess.run(["mpv", "--no-video", "--really-quiet", f"--input-conf={self.input_conf}", path]).returncode
+
+
+def split_speech_chunks(text):
+    """Split text into (paragraph number, chunk) pairs of whole sentences
+
+    The first chunk is a single sentence so playback can start quickly."""
+    chunks = []
+    paragraphs = [p.strip() for p in text.splitlines() if p.strip()]
+    for number, paragraph in enumerate(paragraphs):
+        current = ""
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+            if current and (not chunks or len(current) + len(sentence) >= TTS_CHUNK_CHARS):
+                chunks.append((number, current))
+                current = sentence
+            else:
+                current = f"{current} {sentence}".strip()
+        if current:
+            chunks.append((number, current))
+    return chunks
+
+def stream_speech(speech, text, speed):
+    """Play `text` chunk by chunk; returns the first player exit status that wasn't a skip (0 if none)"""
+    chunks = split_speech_chunks(text)
+    status = 0
+    synth = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    pending = {}
+    position = 0
+    try:
+        while position < len(chunks):
+            for ahead in range(position, min(position + TTS_CHUNK_LOOKAHEAD + 1, len(chunks))):
+                if ahead not in pending:
+                    pending[ahead] = synth.submit(speech.synthesize, chunks[ahead][1], speed)
+            returncode = speech.play(pending.pop(position).result())
+            if returncode not in (0, SKIP_PARAGRAPH) and not status:
+                status = returncode
+            paragraph = chunks[position][0]
+            position += 1
+            if returncode == SKIP_PARAGRAPH:
+                while position < len(chunks) and chunks[position][0] == paragraph:
+                    skipped = pending.pop(position, None)
+                    if skipped:
+                        skipped.cancel()
+                    position += 1
+    finally:
+        synth.shutdown(wait=False, cancel_futures=True)
+    return status
+
+
+# --- storage ---
+DB_BUSY_TIMEOUT = 30
+STORAGE_SETTINGS = {"synchronous": "NORMAL", "cache-size": 64, "mmap-size": 256}
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+WRITE_BATCH_SIZE = 50
+WRITE_BATCH_SECONDS = 2.0
+
+def connect_database(path, readonly=False):
+    """Open `path` with rows as sqlite3.Row and unpack_body available; readers can't write"""
+    if readonly:
+        conn = sqlite3.connect(f"{pathlib.Path(path).absolute().as_uri()}?mode=ro", uri=True, timeout=DB_BUSY_TIMEOUT)
+    else:
+        conn = sqlite3.connect(path, timeout=DB_BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    conn.create_function("unpack_body", 2, unpack_body, deterministic=True)
+    return conn
+
+def tune_connection(conn, settings):
+    """Apply the synchronous / cache-size / mmap-size settings (sizes in MB) to `conn`"""
+    conn.execute(f"PRAGMA synchronous = {settings['synchronous']}")
+    # A negative cache_size is in KiB rather than pages
+    conn.execute(f"PRAGMA cache_size = {-int(settings['cache-size']) * 1024}")
+    conn.execute(f"PRAGMA mmap_size = {int(settings['mmap-size']) * 1024 * 1024}").fetchall()
+
 
 # --- BreifShell ---
 DB_FILENAME = "news.db"
 TTS_SCRIPT = os.path.expanduser("~/.local/bin/tts")
-print("Welcome to brief - RSS/Article Reader with TTS") 
+SEARCH_LIMIT = 20
+LIST_PAGE_SIZE = 20
+REPARSE_BATCH = 100
+FEED_COLUMNS = ("url", "etag", "last_modified", "content_hash", "newest_entry_date", "poll_interval", "poll_floor", "failure_count", "disabled_until", "failed_entries")
+FEED_FAILURE_THRESHOLD = 3
+FEED_BACKOFF_BASE = 60 * 60
+FEED_BACKOFF_MAX = 7 * 24 * 60 * 60
+POLL_DEFAULT_INTERVAL = 60 * 60
+POLL_MIN_INTERVAL = 5 * 60
+POLL_MAX_INTERVAL = 24 * 60 * 60
+POLL_JITTER = 0.1
+SYNDICATION_PERIODS = {"hourly": 3600, "daily": 86400, "weekly": 604800, "monthly": 2592000, "yearly": 31536000}
+RETENTION_RULES = {"max-age": "days", "per-feed": "articles", "max-size": "MB", "read": "on"}
+VACUUM_PAGES = 1000
+VACUUM_BUDGET = 0.5
+EVICT_ROUNDS = 3
 class BriefShell(cmd.Cmd):
     intro = "Type `cmd` to view commands and `help` or `?` for help"
     prompt = "> "
-    def __init__(self):
+    def __init__(self, report=print):
         super().__init__()
-        self.conn = sqlite3.connect(DB_FILENAME)
-        self.conn.row_factory = sqlite3.Row
+        # One-time migration messages; batch mode sends them to stderr to keep stdout machine-readable
+        self.report = report
+        # One connection writes (batching commits during fetches); listing, reading and
+        # searching go through a read-only one so they don't wait on a fetch in progress
+        self.conn = connect_database(DB_FILENAME)
+        self.enable_incremental_vacuum()
+        self.conn.execute("PRAGMA journal_mode = WAL").fetchall()
         self.create_tables()
+        self.reader = connect_database(DB_FILENAME, readonly=True)
+        self.tune_storage()
+        self.batching = False
+        self.batch_writes = 0
+        self.batch_opened = 0
+        self.batch_deferred = None
+        self.article_files = ArticleFiles()
         self.playback_speed = 0.5
+        self.list_cursor = None
+
+    def onecmd(self, line):
+        name = self.parseline(line)[0]
+        if not name or not hasattr(self, 'do_' + name):
+            return super().onecmd(line)
+        with metrics.timer(f"command.{name}"):
+            return super().onecmd(line)
+
+    def enable_incremental_vacuum(self):
+        """Switch the database to auto_vacuum=INCREMENTAL so freed pages can be released in small steps"""
+        c = self.conn.cursor()
+        c.execute("PRAGMA auto_vacuum")
+        if c.fetchone()[0] == 2:
+            return
+        c.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        c.execute("SELECT 1 FROM sqlite_master LIMIT 1")
+        if c.fetchone() is not None:
+            # The mode of an existing database only changes when it is rebuilt
+            self.report("Enabling incremental vacuum (one-time rebuild of the database)...")
+            self.conn.execute("VACUUM")
 
     def create_tables(self):
         c = self.conn.cursor()
         try:
             c.executescript("""
+                CREATE TABLE IF NOT EXISTS setting (
+                    name TEXT PRIMARY KEY,
+                    value TEXT
+                );
+
                 CREATE TABLE IF NOT EXISTS rss_feeds (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    url TEXT UNIQUE NOT NULL
+                    url TEXT UNIQUE NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content_hash TEXT,
+                    newest_entry_date TEXT,
+                    poll_interval REAL,
+                    poll_floor REAL,
+                    next_poll_at REAL,
+                    failure_count INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    last_failure_at REAL,
+                    last_success_at REAL,
+                    disabled_until REAL,
+                    latency REAL
                 );
 
+                CREATE TABLE IF NOT EXISTS feed_entry (
+                    feed_id INTEGER NOT NULL,
+                    entry_key TEXT NOT NULL,
+                    PRIMARY KEY (feed_id, entry_key)
+                ) WITHOUT ROWID;
+
+                CREATE TRIGGER IF NOT EXISTS rss_feeds_delete_entries AFTER DELETE ON rss_feeds BEGIN
+                    DELETE FROM feed_entry WHERE feed_id = old.id;
+                END;
+
                 CREATE TABLE IF NOT EXISTS article (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     url TEXT UNIQUE,
                     title TEXT,
-                    content TEXT,
                     source TEXT,
                     fetched_date TEXT,
-                    publish_date TEXT
+                    publish_date TEXT,
+                    html_sha TEXT,
+                    duplicate_of INTEGER,
+                    read_at REAL,
+                    site TEXT,
+                    publish_ts INTEGER,
+                    display_date TEXT
+                );
+
+                CREATE TABLE IF NOT EXISTS article_body (
+                    article_id INTEGER PRIMARY KEY,
+                    codec TEXT NOT NULL,
+                    raw_size INTEGER NOT NULL,
+                    body BLOB
+                );
+
+                CREATE TRIGGER IF NOT EXISTS article_delete_body AFTER DELETE ON article BEGIN
+                    DELETE FROM article_body WHERE article_id = old.id;
+                END;
+
+                CREATE TABLE IF NOT EXISTS html_archive (
+                    sha TEXT PRIMARY KEY,
+                    codec TEXT NOT NULL,
+                    raw_size INTEGER NOT NULL,
+                    body BLOB
                 );
+
+                CREATE INDEX IF NOT EXISTS article_publish_date ON article (publish_date, id);
+                CREATE INDEX IF NOT EXISTS article_source ON article (source);
+
+                CREATE VIEW IF NOT EXISTS article_ordinal AS
+                    SELECT ROW_NUMBER() OVER (ORDER BY publish_date ASC, id ASC) AS ordinal, id FROM article;
+
+                CREATE VIEW IF NOT EXISTS rss_feeds_ordinal AS
+                    SELECT ROW_NUMBER() OVER (ORDER BY id ASC) AS ordinal, id FROM rss_feeds;
             """)
             self.conn.commit()
+            self.migrate_article_bodies()
+            self.add_missing_columns("article", [("html_sha", "TEXT")])
+            c.executescript("""
+                CREATE INDEX IF NOT EXISTS article_html_sha ON article (html_sha);
+
+                CREATE TRIGGER IF NOT EXISTS article_delete_html AFTER DELETE ON article WHEN old.html_sha IS NOT NULL BEGIN
+                    DELETE FROM html_archive WHERE sha = old.html_sha
+                        AND NOT EXISTS (SELECT 1 FROM article WHERE html_sha = old.html_sha);
+                END;
+            """)
+            c.execute("PRAGMA table_info(article)")
+            listing_added = 'site' not in {row['name'] for row in c.fetchall()}
+            self.add_missing_columns("article", [("duplicate_of", "INTEGER"), ("read_at", "REAL"),
+                                                 ("site", "TEXT"), ("publish_ts", "INTEGER"), ("display_date", "TEXT")])
+            if listing_added:
+                self.backfill_listing_metadata()
+            c.executescript("""
+                CREATE INDEX IF NOT EXISTS article_site ON article (site, publish_date, id);
+                CREATE INDEX IF NOT EXISTS article_publish_ts ON article (publish_ts);
+            """)
+            c.execute("SELECT 1 FROM sqlite_master WHERE name = 'article_fingerprint'")
+            fingerprints_created = c.fetchone() is None
+            # One indexed column per SIMHASH_BANDS band: texts within SIMHASH_DISTANCE bits share at least one band
+            c.executescript("""
+                CREATE TABLE IF NOT EXISTS article_fingerprint (
+                    article_id INTEGER PRIMARY KEY,
+                    simhash INTEGER NOT NULL,
+                    band0 INTEGER NOT NULL,
+                    band1 INTEGER NOT NULL,
+                    band2 INTEGER NOT NULL,
+                    band3 INTEGER NOT NULL
+                );
+
+                CREATE INDEX IF NOT EXISTS article_fingerprint_band0 ON article_fingerprint (band0);
+                CREATE INDEX IF NOT EXISTS article_fingerprint_band1 ON article_fingerprint (band1);
+                CREATE INDEX IF NOT EXISTS article_fingerprint_band2 ON article_fingerprint (band2);
+                CREATE INDEX IF NOT EXISTS article_fingerprint_band3 ON article_fingerprint (band3);
+                CREATE INDEX IF NOT EXISTS article_duplicate_of ON article (duplicate_of) WHERE duplicate_of IS NOT NULL;
+
+                CREATE TRIGGER IF NOT EXISTS article_delete_fingerprint AFTER DELETE ON article BEGIN
+                    DELETE FROM article_fingerprint WHERE article_id = old.id;
+                    UPDATE article SET duplicate_of = NULL WHERE duplicate_of = old.id;
+                END;
+            """)
+            if fingerprints_created:
+                self.backfill_fingerprints()
+            self.create_search_index()
+            self.add_missing_columns("rss_feeds", [("etag", "TEXT"), ("last_modified", "TEXT"), ("content_hash", "TEXT"), ("newest_entry_date", "TEXT"),
+                                                 ("poll_interval", "REAL"), ("poll_floor", "REAL"), ("next_poll_at", "REAL"),
+                                                 ("failure_count", "INTEGER NOT NULL DEFAULT 0"), ("last_error", "TEXT"), ("last_failure_at", "REAL"),
+                                                 ("last_success_at", "REAL"), ("disabled_until", "REAL"), ("latency", "REAL"),
+                                                 ("failed_entries", "INTEGER NOT NULL DEFAULT 0")])
         finally:
             c.close()
 
+    def create_search_index(self):
+        c = self.conn.cursor()
+        c.execute("SELECT 1 FROM sqlite_master WHERE name = 'article_fts'")
+        created = c.fetchone() is None
+        try:
+            c.executescript("""
+                CREATE VIEW IF NOT EXISTS article_text AS
+                    SELECT a.id, a.title, unpack_body(b.codec, b.body) AS content
+                    FROM article a JOIN article_body b ON b.article_id = a.id;
+
+                CREATE VIRTUAL TABLE IF NOT EXISTS article_fts USING fts5(
+                    title, content, content='article_text', content_rowid='id'
+                );
+
+                -- The triggers only queue the old and new (still compressed) values with plain SQL, so
+                -- any SQLite client can change articles; brief replays the queue with unpack_body
+                CREATE TABLE IF NOT EXISTS article_fts_queue (
+                    seq INTEGER PRIMARY KEY,
+                    op TEXT NOT NULL,
+                    article_id INTEGER NOT NULL,
+                    title TEXT,
+                    codec TEXT,
+                    body BLOB
+                );
+
+                DROP TRIGGER IF EXISTS article_fts_insert;
+                DROP TRIGGER IF EXISTS article_fts_delete;
+                DROP TRIGGER IF EXISTS article_fts_update_title;
+                DROP TRIGGER IF EXISTS article_fts_update_body;
+
+                CREATE TRIGGER IF NOT EXISTS article_fts_queue_insert AFTER INSERT ON article_body BEGIN
+                    INSERT INTO article_fts_queue (op, article_id, title, codec, body)
+                    SELECT 'add', new.article_id, title, new.codec, new.body FROM article WHERE id = new.article_id;
+                END;
+
+                CREATE TRIGGER IF NOT EXISTS article_fts_queue_delete BEFORE DELETE ON article BEGIN
+                    INSERT INTO article_fts_queue (op, article_id, title, codec, body)
+                    SELECT 'remove', old.id, old.title, codec, body FROM article_body WHERE article_id = old.id;
+                END;
+
+                CREATE TRIGGER IF NOT EXISTS article_fts_queue_title AFTER UPDATE OF title ON article BEGIN
+                    INSERT INTO article_fts_queue (op, article_id, title, codec, body)
+                    SELECT 'remove', old.id, old.title, codec, body FROM article_body WHERE article_id = old.id;
+                    INSERT INTO article_fts_queue (op, article_id, title, codec, body)
+                    SELECT 'add', new.id, new.title, codec, body FROM article_body WHERE article_id = new.id;
+                END;
+
+                CREATE TRIGGER IF NOT EXISTS article_fts_queue_body AFTER UPDATE OF codec, body ON article_body BEGIN
+                    INSERT INTO article_fts_queue (op, article_id, title, codec, body)
+                    SELECT 'remove', old.article_id, title, old.codec, old.body FROM article WHERE id = old.article_id;
+                    INSERT INTO article_fts_queue (op, article_id, title, codec, body)
+                    SELECT 'add', new.article_id, title, new.codec, new.body FROM article WHERE id = new.article_id;
+                END;
+            """)
+        except sqlite3.OperationalError as e:
+            self.report(f"Full-text search unavailable: {e}")
+            return
+        if created:
+            self.rebuild_search_index()
+        else:
+            # Catch up on changes other programs made since the last session
+            self.sync_search_index()
+            self.conn.commit()
+
+    def sync_search_index(self):
+        """Apply the queued article changes to the search index (no commit)"""
+        c = self.conn.cursor()
+        try:
+            c.execute("SELECT MAX(seq) FROM article_fts_queue")
+        except sqlite3.OperationalError:
+            return
+        last = c.fetchone()[0]
+        if last is None:
+            return
+        with metrics.timer("db.sync_search"):
+            c.execute("""
+            INSERT INTO article_fts (article_fts, rowid, title, content)
+            SELECT CASE op WHEN 'remove' THEN 'delete' END, article_id, title, unpack_body(codec, body)
+            FROM article_fts_queue WHERE seq <= ? ORDER BY seq
+            """, (last,))
+            c.execute("DELETE FROM article_fts_queue WHERE seq <= ?", (last,))
+
+    def migrate_article_bodies(self):
+        """Move bodies out of the old article.content column into compressed article_body rows"""
+        c = self.conn.cursor()
+        c.execute("PRAGMA table_info(article)")
+        if 'content' not in {row['name'] for row in c.fetchall()}:
+            return
+        c.execute("SELECT 1 FROM article WHERE content IS NOT NULL LIMIT 1")
+        if c.fetchone() is None:
+            return
+        self.report("Moving article bodies to compressed storage...")
+        c.executescript("""
+            DROP TRIGGER IF EXISTS article_fts_insert;
+            DROP TRIGGER IF EXISTS article_fts_delete;
+            DROP TRIGGER IF EXISTS article_fts_update;
+            DROP TABLE IF EXISTS article_fts;
+        """)
+        reader = self.conn.cursor()
+        reader.execute("SELECT id, content FROM article WHERE content IS NOT NULL")
+        moved = 0
+        while True:
+            rows = reader.fetchmany(500)
+            if not rows:
+                break
+            c.executemany("INSERT OR REPLACE INTO article_body (article_id, codec, raw_size, body) VALUES (?, ?, ?, ?)",
+                          [(row['id'], *pack_body(row['content'])) for row in rows])
+            moved += len(rows)
+        if sqlite3.sqlite_version_info >= (3, 35, 0):
+            c.execute("ALTER TABLE article DROP COLUMN content")
+        else:
+            c.execute("UPDATE article SET content = NULL")
+        self.conn.commit()
+        self.conn.execute("VACUUM")
+        self.report(f"Compressed {moved} article bodies")
+
+    def backfill_listing_metadata(self):
+        """Fill site, publish_ts and display_date for articles saved before they were stored"""
+        c = self.conn.cursor()
+        c.execute("SELECT COUNT(*) FROM article")
+        total = c.fetchone()[0]
+        if not total:
+            return
+        self.report(f"Precomputing listing details for {total} articles...")
+        reader = self.conn.cursor()
+        reader.execute("SELECT id, source, publish_date FROM article")
+        rows = reader.fetchall()
+        c.executemany("UPDATE article SET site = ?, publish_date = ?, publish_ts = ?, display_date = ? WHERE id = ?",
+                      [(*self.listing_metadata(row['source'], row['publish_date']), row['id']) for row in rows])
+        self.conn.commit()
+
+    def backfill_fingerprints(self):
+        """Compute SimHash fingerprints for articles saved before duplicate detection existed"""
+        c = self.conn.cursor()
+        c.execute("SELECT COUNT(*) FROM article_body")
+        total = c.fetchone()[0]
+        if not total:
+            return
+        self.report(f"Fingerprinting {total} articles for duplicate detection...")
+        last = 0
+        with extraction_pool() as pool:
+            while True:
+                c.execute("SELECT article_id, codec, body FROM article_body WHERE article_id > ? ORDER BY article_id LIMIT ?", (last, REPARSE_BATCH))
+                rows = c.fetchall()
+                if not rows:
+                    break
+                fingerprints = pool.map(fingerprint_body, [row['codec'] for row in rows], [row['body'] for row in rows], chunksize=16)
+                for row, fingerprint in zip(rows, fingerprints):
+                    self.store_fingerprint(row['article_id'], fingerprint)
+                last = rows[-1]['article_id']
+        self.conn.commit()
+
+    def store_fingerprint(self, article_id, fingerprint):
+        if fingerprint is None:
+            return
+        self.conn.execute("INSERT OR REPLACE INTO article_fingerprint (article_id, simhash, band0, band1, band2, band3) VALUES (?, ?, ?, ?, ?, ?)",
+                          (article_id, fingerprint, *simhash_bands(fingerprint)))
+
+    def find_near_duplicate(self, fingerprint):
+        """The article (or the original of its group) whose text is within SIMHASH_DISTANCE bits, or None"""
+        if fingerprint is None:
+            return None
+        c = self.conn.cursor()
+        with metrics.timer("db.find_duplicate"):
+            c.execute("SELECT article_id, simhash FROM article_fingerprint WHERE band0 = ? OR band1 = ? OR band2 = ? OR band3 = ?",
+                      simhash_bands(fingerprint))
+            distance, article_id = min(((hamming_distance(fingerprint, row['simhash']), row['article_id']) for row in c), default=(None, None))
+            if article_id is None or distance > SIMHASH_DISTANCE:
+                return None
+            c.execute("SELECT COALESCE(duplicate_of, id) FROM article WHERE id = ?", (article_id,))
+            return c.fetchone()[0]
+
+    def load_body(self, article_id):
+        c = self.reader.cursor()
+        with metrics.timer("db.load_body"):
+            c.execute("SELECT codec, body FROM article_body WHERE article_id = ?", (article_id,))
+            row = c.fetchone()
+            return unpack_body(row['codec'], row['body']) if row else None
+
+    def rebuild_search_index(self):
+        c = self.conn.cursor()
+        c.execute("DELETE FROM article_fts_queue")
+        c.execute("INSERT INTO article_fts (article_fts) VALUES ('rebuild')")
+        self.conn.commit()
+
+    def add_missing_columns(self, table_name, columns):
+        c = self.conn.cursor()
+        c.execute(f"PRAGMA table_info({table_name})")
+        existing = {row['name'] for row in c.fetchall()}
+        for name, decl in columns:
+            if name not in existing:
+                c.execute(f"ALTER TABLE {table_name} ADD COLUMN {name} {decl}")
+        self.conn.commit()
+
     @staticmethod
     def parse_id_string(id_string):
         def parse_range(part):
@@ -127,175 +1508,815 @@ class BriefShell(cmd.Cmd):
         ids = set(itertools.chain.from_iterable(map(parse_range, parts)))
         return sorted(ids)
 
-    def reset_sqlite_autoincrement(self):
-        try:
-            c = self.conn.cursor()
-            c.execute("SELECT MAX(id) AS max_id FROM article")
-            row = c.fetchone() 
-            max_id = row['max_id'] if row and row['max_id'] is not None else 0
-            if max_id == 0:
-                c.execute("DELETE FROM sqlite_sequence WHERE name='article'")
+    def resolve_ordinals(self, table_name, ordinals, columns=(), conn=None):
+        """Map the numbers shown by `list` to rows, keyed by number in the order given"""
+        c = (conn or self.conn).cursor()
+        select = ', '.join(['o.ordinal', 't.id'] + [f't.{col}' for col in columns])
+        query = f"SELECT {select} FROM {table_name}_ordinal o JOIN {table_name} t ON t.id = o.id"
+        if not ordinals:
+            return {}
+        with metrics.timer("db.resolve_ordinals"):
+            if ordinals == "*":
+                c.execute(f"{query} ORDER BY o.ordinal ASC")
+                return {row['ordinal']: row for row in c.fetchall()}
+            c.execute(f"{query} WHERE o.ordinal BETWEEN ? AND ?", (min(ordinals), max(ordinals)))
+            found = {row['ordinal']: row for row in c.fetchall()}
+        return {ordinal: found[ordinal] for ordinal in ordinals if ordinal in found}
+
+    @staticmethod
+    def day_start(date_string):
+        """UTC epoch of midnight at the start of a YYYY-MM-DD day"""
+        return calendar.timegm(datetime.date.fromisoformat(date_string).timetuple())
+
+    def iter_articles(self, after=None, since=None, source=None, limit=None, until=None, by_site=False):
+        """Stream article rows in list order (grouped by site if `by_site`), each with its list number
+
+        `after` is the (ordinal, publish_date, id) of the last row already shown; `since` and
+        `until` are inclusive YYYY-MM-DD days."""
+        c = self.reader.cursor()
+        conditions, params = [], []
+        if after:
+            ordinal, publish_date, article_id = after
+            if publish_date is None:
+                conditions.append("((a.publish_date IS NULL AND a.id > ?) OR a.publish_date IS NOT NULL)")
+                params.append(article_id)
             else:
-                c.execute("UPDATE sqlite_sequence SET seq = ? WHERE name='article'", (max_id,))
-            self.conn.commit()
-        except sqlite3.Error as e:
-            print(f"Error resetting autoincrement: {e}")
+                conditions.append("(a.publish_date, a.id) > (?, ?)")
+                params.extend([publish_date, article_id])
+        if since:
+            conditions.append("a.publish_ts >= ?")
+            params.append(self.day_start(since))
+        if until:
+            conditions.append("a.publish_ts < ?")
+            params.append(self.day_start(until) + 86400)
+        if source:
+            host = source.lower()
+            conditions.append("a.site = ?")
+            params.append(host[4:] if host.startswith("www.") else host)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        limit_clause = f"LIMIT {int(limit)}" if limit else ""
+        columns = "a.id, a.title, a.site, a.display_date, a.publish_date, a.url, a.duplicate_of"
+        if source or by_site:
+            # Filtering by source leaves gaps in the numbering, so take the numbers from the view
+            order = "a.site IS NULL, a.site, o.ordinal" if by_site else "o.ordinal"
+            c.execute(f"""
+            SELECT o.ordinal, {columns}
+            FROM article_ordinal o JOIN article a ON a.id = o.id {where} ORDER BY {order} {limit_clause}
+            """, params)
+            yield from map(dict, c)
+            return
+        if after:
+            start = after[0]
+        elif since or until:
+            # Undated articles sort first and the date filters skip them, so number from after them
+            if since:
+                c.execute("SELECT COUNT(*) FROM article WHERE publish_ts < ? OR publish_ts IS NULL", (self.day_start(since),))
+            else:
+                c.execute("SELECT COUNT(*) FROM article WHERE publish_ts IS NULL")
+            start = c.fetchone()[0]
+        else:
+            start = 0
+        c.execute(f"""
+        SELECT {columns} FROM article a {where}
+        ORDER BY a.publish_date ASC, a.id ASC {limit_clause}
+        """, params)
+        for ordinal, row in enumerate(c, start + 1):
+            row = dict(row)
+            row['ordinal'] = ordinal
+            yield row
+
+    def delete_ids(self, table_name, ids):
+        c = self.conn.cursor()
+        ids = list(ids)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            c.execute(f"DELETE FROM {table_name} WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+        self.flush()
+        self.reclaim_space()
+        return len(ids)
+
+    def reclaim_space(self, budget=VACUUM_BUDGET):
+        """Return free pages to the filesystem VACUUM_PAGES at a time for up to `budget` seconds (None: all)"""
+        c = self.conn.cursor()
+        c.execute("PRAGMA auto_vacuum")
+        if c.fetchone()[0] != 2:
+            return 0
+        started = time.monotonic()
+        freed = 0
+        while budget is None or time.monotonic() - started < budget:
+            c.execute("PRAGMA freelist_count")
+            free = c.fetchone()[0]
+            if not free:
+                break
+            # Each step of the pragma releases one page and the cursor stops after the first,
+            # so let executescript run it to completion
+            self.conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES});")
+            freed += min(free, VACUUM_PAGES)
+        self.conn.commit()
+        return freed
+
+    def used_bytes(self):
+        c = self.conn.cursor()
+        c.execute("SELECT (SELECT page_count FROM pragma_page_count) - (SELECT freelist_count FROM pragma_freelist_count), (SELECT page_size FROM pragma_page_size)")
+        pages, page_size = c.fetchone()
+        return pages * page_size
+
+    def get_setting(self, name, default=None):
+        c = self.conn.cursor()
+        c.execute("SELECT value FROM setting WHERE name = ?", (name,))
+        row = c.fetchone()
+        return row['value'] if row else default
+
+    def set_setting(self, name, value):
+        if value is None:
+            self.conn.execute("DELETE FROM setting WHERE name = ?", (name,))
+        else:
+            self.conn.execute("INSERT INTO setting (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = excluded.value", (name, str(value)))
+        self.conn.commit()
+
+    def storage_settings(self):
+        settings = dict(STORAGE_SETTINGS)
+        for name in STORAGE_SETTINGS:
+            value = self.get_setting(f"storage.{name}")
+            if value is not None:
+                settings[name] = value if name == "synchronous" else int(value)
+        return settings
+
+    def tune_storage(self):
+        settings = self.storage_settings()
+        tune_connection(self.conn, settings)
+        tune_connection(self.reader, settings)
+        return settings
+
+    def commit(self):
+        """Commit now, or inside write_batch() once WRITE_BATCH_SIZE writes or WRITE_BATCH_SECONDS have piled up
+
+        Call it after every write, so the batch's age counts from its first write."""
+        if self.batching:
+            if not self.batch_writes:
+                self.batch_opened = time.monotonic()
+            self.batch_writes += 1
+            if self.batch_writes < WRITE_BATCH_SIZE and time.monotonic() - self.batch_opened < WRITE_BATCH_SECONDS:
+                if self.batch_deferred:
+                    self.batch_deferred()
+                return
+        self.flush()
+
+    def flush(self):
+        """Commit whatever a write_batch() is holding back"""
+        self.sync_search_index()
+        if self.conn.in_transaction:
+            with metrics.timer("db.commit"):
+                self.conn.commit()
+        self.batch_writes = 0
+
+    @contextlib.contextmanager
+    def write_batch(self, deferred=None):
+        """Group the commit() calls made inside into fewer transactions
+
+        `deferred()` is called whenever a commit is held back. The Ingestor uses it to flush
+        before its event loop next waits, so the write lock is never held across a download."""
+        if self.batching:
+            yield
+            return
+        self.batching = True
+        self.batch_deferred = deferred
+        try:
+            yield
+        finally:
+            self.batching = False
+            self.batch_deferred = None
+            self.flush()
+
+    @property
+    def duplicate_policy(self):
+        """What to do with near-duplicate articles, as saved by `article dedup`"""
+        return self.get_setting("dedup.policy", DUPLICATE_POLICY)
+
+    def retention_policy(self):
+        """The stored retention rules, keyed like RETENTION_RULES; unset rules are left out"""
+        policy = {}
+        for rule in RETENTION_RULES:
+            value = self.get_setting(f"retention.{rule}")
+            if value is not None:
+                policy[rule] = value == "on" if rule == "read" else int(value)
+        return policy
+
+    def apply_retention(self, policy):
+        """Delete every article outside the policy in one transaction; returns {rule: articles deleted}"""
+        c = self.conn.cursor()
+        deleted = {}
+        try:
+            if policy.get("max-age"):
+                cutoff = (datetime.date.today() - datetime.timedelta(days=policy["max-age"])).isoformat()
+                c.execute("DELETE FROM article WHERE COALESCE(publish_date, fetched_date) < ?", (cutoff,))
+                deleted["max-age"] = c.rowcount
+            if policy.get("per-feed"):
+                c.execute("""
+                DELETE FROM article WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, ROW_NUMBER() OVER (PARTITION BY source ORDER BY publish_date DESC, id DESC) AS newest
+                        FROM article WHERE source IN (SELECT url FROM rss_feeds)
+                    ) WHERE newest > ?
+                )
+                """, (policy["per-feed"],))
+                deleted["per-feed"] = c.rowcount
+            if policy.get("read"):
+                c.execute("DELETE FROM article WHERE read_at IS NOT NULL")
+                deleted["read"] = c.rowcount
+            if any(deleted.values()):
+                self.optimize_search_index()
+            if policy.get("max-size"):
+                deleted["max-size"] = self.evict_to_size(policy["max-size"] * 1024 * 1024)
+        except BaseException:
             self.conn.rollback()
+            raise
+        self.conn.commit()
+        if any(deleted.values()):
+            self.reclaim_space()
+        return deleted
 
-    def delete_rows_with_confirmation(self, table_name, display_columns, id_str, renumber_func=None, reset_func=None):
+    def evict_to_size(self, max_bytes):
+        """Delete the oldest articles until the database fits in `max_bytes` (no commit)"""
         c = self.conn.cursor()
+        deleted = 0
+        for _ in range(EVICT_ROUNDS):
+            used = self.used_bytes()
+            if used <= max_bytes:
+                break
+            c.execute("SELECT COALESCE(SUM(LENGTH(body)), 0) FROM article_body")
+            stored = c.fetchone()[0]
+            c.execute("SELECT COALESCE(SUM(LENGTH(body)), 0) FROM html_archive")
+            stored += c.fetchone()[0]
+            if not stored:
+                break
+            # Indexes and the search index grow with the articles, so scale the excess down to article bytes
+            target = (used - max_bytes) * stored / used
+            c.execute("""
+            SELECT COALESCE(LENGTH(b.body), 0) + COALESCE(LENGTH(h.body), 0) AS size
+            FROM article a LEFT JOIN article_body b ON b.article_id = a.id LEFT JOIN html_archive h ON h.sha = a.html_sha
+            ORDER BY a.publish_date ASC, a.id ASC
+            """)
+            count = freed = 0
+            for row in c:
+                if freed >= target:
+                    break
+                freed += row['size']
+                count += 1
+            c.execute("DELETE FROM article WHERE id IN (SELECT id FROM article ORDER BY publish_date ASC, id ASC LIMIT ?)", (count,))
+            deleted += c.rowcount
+            self.optimize_search_index()
+        return deleted
+
+    def optimize_search_index(self):
+        # Deleting from the external-content index only adds tombstones; merging drops them and their pages
+        self.sync_search_index()
+        self.conn.execute("INSERT INTO article_fts (article_fts) VALUES ('optimize')")
+
+    def delete_rows_with_confirmation(self, table_name, display_columns, id_str):
         if id_str == "*":
-            c.execute(f"SELECT id, url FROM {table_name} ORDER BY id ASC")
-            rows_to_delete = c.fetchall()
+            rows_to_delete = self.resolve_ordinals(table_name, "*", display_columns)
             if not rows_to_delete:
                 print(f"No records found to delete in {table_name}.")
                 return False
         else:
-            ids = self.parse_id_string(id_str)
-            if not ids:
+            ordinals = self.parse_id_string(id_str)
+            if not ordinals:
                 print("No valid ID provided to delete")
                 return False
-            placeholders = ','.join('?' * len(ids))
-            c.execute(f"SELECT id, url FROM {table_name} WHERE id IN ({placeholders}) ORDER BY id ASC", ids)
-            rows_to_delete = c.fetchall()
+            rows_to_delete = self.resolve_ordinals(table_name, ordinals, display_columns)
             if not rows_to_delete:
                 print(f"No records found with the specified ID in {table_name}")
                 return False
         print(f"Records to be deleted from {table_name}:")
-        for row in rows_to_delete:
-            print(f"{row['id']}. {row['url']}")
+        for ordinal, row in rows_to_delete.items():
+            print(f"{ordinal}. {row[display_columns[0]]}")
         confirm = input("Are you sure you want to delete these records? [Y/n] ").strip().lower()
         if confirm != 'y':
             print("Deletion cancelled")
             return False
-        removed_any = False
-        for row in rows_to_delete:
-            c.execute(f"DELETE FROM {table_name} WHERE id = ?", (row['id'],))
-            if c.rowcount > 0:
-                print(f"Deleted record ID {row['id']}")
-                removed_any = True
-            else:
-                print(f"Record with ID {row['id']} was not found or already deleted")
-        if removed_any:
-            self.conn.commit()
-            if renumber_func:
-                renumber_func()
-            if reset_func:
-                reset_func()
-        return removed_any
-
-    @staticmethod
-    def renumber_ids(table_name):
-        c = shell.conn.cursor()
-        c.execute(f"SELECT id FROM {table_name} ORDER BY publish_date ASC")
-        rows = c.fetchall()
-        offset = 10000
-        for row in rows:
-            old_id = row['id']
-            c.execute(f"UPDATE {table_name} SET id = ? WHERE id = ?", (old_id + offset, old_id))
-        for new_id, row in enumerate(rows, start=1):
-            temp_id = row['id'] + offset
-            c.execute(f"UPDATE {table_name} SET id = ? WHERE id = ?", (new_id, temp_id))
-        shell.conn.commit()
-
-
-    @staticmethod
-    def write_temp_file(content):
-        tf = tempfile.NamedTemporaryFile(mode='w', delete=False, encoding='utf-8', suffix=".txt")
-        tf.write(content)
-        tf.close()
-        return tf.name
+        deleted = self.delete_ids(table_name, [row['id'] for row in rows_to_delete.values()])
+        print(f"Deleted {deleted} record(s)")
+        return deleted > 0
 
     @staticmethod
     def parse_publish_date(date_source):
+        """Publication time of a feed entry or extracted article as a naive UTC datetime, or None"""
         if hasattr(date_source, 'published_parsed') and date_source.published_parsed:
             try:
-                dt = datetime.datetime(*date_source.published_parsed[:6]).date()
-                return dt
+                return datetime.datetime(*date_source.published_parsed[:6])
             except Exception:
                 pass
         if hasattr(date_source, 'published'):
             try:
-                dt = dateutil_parser.parse(date_source.published).date()
-                return dt
+                return parse_date_string(date_source.published)
             except Exception:
                 pass
         if hasattr(date_source, 'publish_date') and date_source.publish_date:
             try:
-                dt = date_source.publish_date.date()
-                return dt
+                return to_utc(date_source.publish_date)
             except Exception:
                 pass
         return None
 
+    @staticmethod
+    def listing_metadata(source, published):
+        """(site, publish_date, publish_ts, display_date) as stored with each article, so listings need no parsing
+
+        `published` is a naive UTC datetime, a date, a YYYY-MM-DD string or None."""
+        site = urlsplit(source).hostname if source else None
+        if site and site.startswith("www."):
+            site = site[4:]
+        if isinstance(published, str):
+            try:
+                published = datetime.date.fromisoformat(published[:10])
+            except ValueError:
+                return site, published, None, published
+        if published is None:
+            return site, None, None, None
+        if not isinstance(published, datetime.datetime):
+            published = datetime.datetime(published.year, published.month, published.day)
+        return site, published.date().isoformat(), calendar.timegm(published.timetuple()), published.strftime("%m/%d/%Y")
+
+    @staticmethod
+    def entry_key(entry):
+        return entry.get('id') or entry.get('link')
+
+    @staticmethod
+    def entry_date(entry):
+        parsed = entry.get('published_parsed') or entry.get('updated_parsed')
+        if not parsed:
+            return None
+        try:
+            return datetime.datetime(*parsed[:6]).isoformat()
+        except Exception:
+            return None
+
     @staticmethod
     def article_summary(a):
-        site_name = urlparse(a['source']).hostname or "(unknown website)"
-        site_name = site_name[4:] if site_name.startswith("www.") else site_name
-        pub = a['publish_date'] if 'publish_date' in a.keys() else None
-        pubtxt = ""
-        if pub:
+        pubtxt = f"{a['display_date']}) " if a['display_date'] else ""
+        duplicate = " [duplicate]" if 'duplicate_of' in a.keys() and a['duplicate_of'] else ""
+        return f"{a['ordinal']}. {a['title']} (publication: {pubtxt}(source: {a['site'] or '(unknown website)'}){duplicate}"
+
+
+
+
+
+    def archive_html(self, html):
+        sha = hashlib.sha256(html.encode("utf-8")).hexdigest()
+        c = self.conn.cursor()
+        c.execute("SELECT 1 FROM html_archive WHERE sha = ?", (sha,))
+        if c.fetchone() is None:
+            c.execute("INSERT INTO html_archive (sha, codec, raw_size, body) VALUES (?, ?, ?, ?)", (sha, *pack_body(html)))
+        return sha
+
+    def reparse_articles(self, article_ids, report=print):
+        """Re-run extraction over archived HTML; returns (updated, unchanged, without HTML) counts"""
+        c = self.conn.cursor()
+        updated = unchanged = missing = 0
+        article_ids = list(article_ids)
+        with extraction_pool() as pool:
+            for start in range(0, len(article_ids), REPARSE_BATCH):
+                chunk = article_ids[start:start + REPARSE_BATCH]
+                c.execute(f"""
+                SELECT a.id, a.url, a.title, h.codec, h.body FROM article a
+                LEFT JOIN html_archive h ON h.sha = a.html_sha
+                WHERE a.id IN ({','.join('?' * len(chunk))})
+                """, chunk)
+                rows = c.fetchall()
+                archived = [row for row in rows if row['body'] is not None]
+                missing += len(rows) - len(archived)
+                jobs = [pool.submit(reextract_article, row['url'], row['codec'], row['body']) for row in archived]
+                for row, job in zip(archived, jobs):
+                    try:
+                        article = job.result()
+                    except Exception as e:
+                        report(f"Failed to re-extract {row['url']}: {e}")
+                        unchanged += 1
+                        continue
+                    old_text = self.load_body(row['id'])
+                    if not article.text.strip() or (article.title == row['title'] and article.text == old_text):
+                        unchanged += 1
+                        continue
+                    c.execute("UPDATE article SET title = ? WHERE id = ? AND title IS NOT ?", (article.title, row['id'], article.title))
+                    codec, raw_size, body = pack_body(article.text)
+                    c.execute("UPDATE article_body SET codec = ?, raw_size = ?, body = ? WHERE article_id = ?", (codec, raw_size, body, row['id']))
+                    if c.rowcount == 0:
+                        c.execute("INSERT INTO article_body (article_id, codec, raw_size, body) VALUES (?, ?, ?, ?)", (row['id'], codec, raw_size, body))
+                    c.execute("DELETE FROM article_fingerprint WHERE article_id = ?", (row['id'],))
+                    self.store_fingerprint(row['id'], article.fingerprint)
+                    updated += 1
+                self.conn.commit()
+        return updated, unchanged, missing
+
+    def find_duplicate(self, article):
+        """(id, title, reason) of the saved article this extraction duplicates, or None
+
+        The page's canonical URL is always checked; near-identical text only unless dedup is off"""
+        c = self.conn.cursor()
+        if article.canonical_url:
+            c.execute("SELECT id, title FROM article WHERE url = ?", (article.canonical_url,))
+            row = c.fetchone()
+            if row:
+                return row['id'], row['title'], "same canonical URL"
+        if self.duplicate_policy == "off":
+            return None
+        original = self.find_near_duplicate(article.fingerprint)
+        if original is None:
+            return None
+        c.execute("SELECT title FROM article WHERE id = ?", (original,))
+        return original, c.fetchone()['title'], "near-identical text"
+
+    def save_article(self, url, article, source, published, duplicate_of=None):
+        c = self.conn.cursor()
+        fetched_date = article.publish_date.isoformat() if article.publish_date else None
+        site, publish_date, publish_ts, display_date = self.listing_metadata(source, published)
+        with metrics.timer("db.insert"):
+            html_sha = self.archive_html(article.html) if article.html else None
+            c.execute("""
+            INSERT INTO article (url, title, source, fetched_date, publish_date, html_sha, duplicate_of, site, publish_ts, display_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (url, article.title, source, fetched_date, publish_date, html_sha, duplicate_of, site, publish_ts, display_date))
+            article_id = c.lastrowid
+            c.execute("INSERT INTO article_body (article_id, codec, raw_size, body) VALUES (?, ?, ?, ?)",
+                      (article_id, *pack_body(article.text)))
+            self.store_fingerprint(article_id, article.fingerprint)
+        self.commit()
+        metrics.count("articles.saved")
+        return article_id
+
+    def select_feeds(self, feed_ids):
+        """Rows for feed numbers as typed (`*` for all), or None when none are valid"""
+        if list(feed_ids) == ["*"]:
+            return list(self.resolve_ordinals("rss_feeds", "*", FEED_COLUMNS).values())
+        ordinals = self.parse_id_string(' '.join(feed_ids))
+        if not ordinals:
+            return None
+        return list(self.resolve_ordinals("rss_feeds", ordinals, FEED_COLUMNS).values())
+
+    def due_feeds(self, now):
+        c = self.conn.cursor()
+        select = ', '.join(f'f.{col}' for col in FEED_COLUMNS)
+        c.execute(f"""
+        SELECT o.ordinal, f.id, {select} FROM rss_feeds_ordinal o JOIN rss_feeds f ON f.id = o.id
+        WHERE f.next_poll_at IS NULL OR f.next_poll_at <= ? ORDER BY f.next_poll_at ASC
+        """, (now,))
+        return c.fetchall()
+
+    @staticmethod
+    def poll_hint(parsed):
+        """Shortest polling interval in seconds the feed asks for through <ttl> or sy:updatePeriod"""
+        feed = parsed.feed
+        hint = 0
+        try:
+            hint = int(feed.get('ttl', 0)) * 60
+        except (TypeError, ValueError):
+            pass
+        period = SYNDICATION_PERIODS.get(str(feed.get('sy_updateperiod', '')).strip().lower())
+        if period:
             try:
-                dt = datetime.datetime.strptime(pub, "%Y-%m-%d")
-                pubtxt = f"{dt.strftime('%m/%d/%Y')}) "
-            except Exception:
-                pubtxt = f"{pub} "
-        return f"{a['id']}. {a['title']} (publication: {pubtxt}(source: {site_name})"
+                frequency = max(1, int(feed.get('sy_updatefrequency', 1)))
+            except (TypeError, ValueError):
+                frequency = 1
+            hint = max(hint, period / frequency)
+        return hint
+
+    @staticmethod
+    def observed_interval(parsed):
+        """Median gap in seconds between the feed's most recent entries"""
+        stamps = []
+        for entry in parsed.entries:
+            stamp = entry.get('published_parsed') or entry.get('updated_parsed')
+            if stamp:
+                stamps.append(calendar.timegm(stamp))
+        stamps = sorted(stamps, reverse=True)[:10]
+        if len(stamps) < 3:
+            return None
+        gaps = sorted(newer - older for newer, older in zip(stamps, stamps[1:]))
+        return gaps[len(gaps) // 2] or None
+
+    def schedule_next_poll(self, feed, parsed=None, new_items=0, failed=False):
+        interval = feed['poll_interval'] or POLL_DEFAULT_INTERVAL
+        floor = feed['poll_floor'] or 0
+        if failed:
+            interval *= 2
+        else:
+            observed = self.observed_interval(parsed) if parsed is not None else None
+            if observed:
+                interval = (interval + observed) / 2
+            elif new_items:
+                interval /= 2
+            else:
+                interval *= 1.5
+            if parsed is not None:
+                floor = self.poll_hint(parsed)
+        interval = max(min(max(interval, POLL_MIN_INTERVAL), POLL_MAX_INTERVAL), floor)
+        next_poll_at = time.time() + interval * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+        c = self.conn.cursor()
+        c.execute("UPDATE rss_feeds SET poll_interval = ?, poll_floor = ?, next_poll_at = ? WHERE id = ?",
+                  (interval, floor, next_poll_at, feed['id']))
+        self.commit()
+
+    def record_feed_success(self, feed, latency):
+        c = self.conn.cursor()
+        c.execute("""
+        UPDATE rss_feeds SET failure_count = 0, last_error = NULL, disabled_until = NULL, last_success_at = ?,
+            latency = CASE WHEN latency IS NULL THEN ? ELSE latency * 0.7 + ? * 0.3 END
+        WHERE id = ?
+        """, (time.time(), latency, latency, feed['id']))
+        self.commit()
+
+    def record_feed_failure(self, feed, error):
+        """Count a failed fetch; returns the time the feed is disabled until, or None"""
+        failures = (feed['failure_count'] or 0) + 1
+        disabled_until = None
+        if failures >= FEED_FAILURE_THRESHOLD:
+            backoff = FEED_BACKOFF_BASE * 2 ** min(failures - FEED_FAILURE_THRESHOLD, 16)
+            disabled_until = time.time() + min(backoff, FEED_BACKOFF_MAX)
+        self.schedule_next_poll(feed, failed=True)
+        c = self.conn.cursor()
+        c.execute("""
+        UPDATE rss_feeds SET failure_count = ?, last_error = ?, last_failure_at = ?, disabled_until = ?,
+            next_poll_at = MAX(next_poll_at, COALESCE(?, 0))
+        WHERE id = ?
+        """, (failures, error, time.time(), disabled_until, disabled_until, feed['id']))
+        self.commit()
+        return disabled_until
+
+    @staticmethod
+    def format_timestamp(timestamp):
+        return datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M") if timestamp else "-"
+
+    def feeds_by_id(self, feed_ids=None):
+        """Feed rows (with their list numbers) for internal IDs in the order given, or every feed"""
+        rows = self.resolve_ordinals("rss_feeds", "*", FEED_COLUMNS).values()
+        if feed_ids is None:
+            return list(rows)
+        by_id = {row['id']: row for row in rows}
+        return [by_id[feed_id] for feed_id in feed_ids if feed_id in by_id]
+
+    def seen_entries(self, feed_id, keys):
+        c = self.conn.cursor()
+        c.execute(f"SELECT entry_key FROM feed_entry WHERE feed_id = ? AND entry_key IN ({','.join('?' * len(keys))})", (feed_id, *keys))
+        return {row['entry_key'] for row in c.fetchall()}
+
+    def mark_entry_seen(self, feed_id, key):
+        self.conn.execute("INSERT OR IGNORE INTO feed_entry (feed_id, entry_key) VALUES (?, ?)", (feed_id, key))
+        self.commit()
+
+    def article_exists(self, url):
+        return self.conn.execute("SELECT 1 FROM article WHERE url = ?", (url,)).fetchone() is not None
+
+    def update_newest_entry(self, feed_id, entry_date):
+        self.conn.execute("UPDATE rss_feeds SET newest_entry_date = ? WHERE id = ?", (entry_date, feed_id))
+        self.commit()
+
+    def record_failed_entries(self, feed_id, count):
+        """Remember how many entries of the feed's last fetch failed, so the next fetch looks for them"""
+        self.conn.execute("UPDATE rss_feeds SET failed_entries = ? WHERE id = ?", (count, feed_id))
+        self.commit()
+
+    def store_validators(self, feed, result):
+        self.conn.execute("UPDATE rss_feeds SET etag = ?, last_modified = ?, content_hash = ? WHERE id = ?",
+                          (result.etag, result.last_modified, result.content_hash, feed['id']))
+        self.commit()
+
+    def ingest(self, call, report=print, **options):
+        """Run `call(ingestor)` to completion on a new event loop, passing progress messages to `report`"""
+        import asyncio
+        async def run():
+            async with Ingestor(self, on_event=lambda event: report(event.message), start_method="fork", **options) as ingestor:
+                return await call(ingestor)
+        return asyncio.run(run())
+
+    def fetch_feeds(self, feeds, num_to_fetch, report=print, deadline=FETCH_DEADLINE, skip_disabled=True):
+        """Fetch up to `num_to_fetch` new articles from each feed row, returning one result per article
+
+        See Ingestor.fetch_feeds; feeds asked for by number are passed with skip_disabled False."""
+        feed_ids = [feed['id'] for feed in feeds]
+        results = self.ingest(lambda ingestor: ingestor.fetch_feeds(feed_ids, num_to_fetch, deadline, skip_disabled), report)
+        if any(result['status'] == "saved" for result in results):
+            self.enforce_retention(report)
+        return results
+
+    def enforce_retention(self, report=print):
+        policy = self.retention_policy()
+        if not policy:
+            return
+        deleted = self.apply_retention(policy)
+        if any(deleted.values()):
+            report(f"Retention policy removed {sum(deleted.values())} article(s) ({self.describe_deleted(deleted)})")
+
+    @staticmethod
+    def describe_policy(policy):
+        return ", ".join("delete read articles" if rule == "read" else f"{rule} {value} {RETENTION_RULES[rule]}"
+                         for rule, value in policy.items() if value)
 
+    @staticmethod
+    def parse_retention_options(tokens):
+        """Turn `--max-age 30 --read ...` into a policy dict; raises ValueError"""
+        policy = {}
+        tokens = list(tokens)
+        while tokens:
+            option = tokens.pop(0)
+            rule = option[2:] if option.startswith("--") else None
+            if rule == "read":
+                policy["read"] = True
+            elif rule in RETENTION_RULES and tokens:
+                try:
+                    policy[rule] = int(tokens.pop(0))
+                except ValueError:
+                    raise ValueError(f"{option} needs a whole number of {RETENTION_RULES[rule]}") from None
+            else:
+                raise ValueError(f"Unknown option {option}")
+        return policy
+
+    @staticmethod
+    def describe_storage(settings):
+        mmap = f"{settings['mmap-size']} MB" if settings['mmap-size'] else "off"
+        return f"synchronous {settings['synchronous']}, cache {settings['cache-size']} MB, mmap {mmap}"
+
+    @staticmethod
+    def describe_deleted(deleted):
+        return ", ".join(f"{count} by {rule}" for rule, count in deleted.items())
 
+    @staticmethod
+    def is_valid_feed(parsed):
+        return parsed is not None and not parsed.bozo and hasattr(parsed, 'feed') and bool(parsed.feed)
+
+    def add_feeds(self, urls):
+        """Validate feeds concurrently and insert the good ones in one transaction
+
+        Returns (added, invalid, already added) lists of URLs"""
+        c = self.conn.cursor()
+        c.execute("SELECT url FROM rss_feeds")
+        existing = {row['url'] for row in c.fetchall()}
+        urls = list(dict.fromkeys(urls))
+        duplicates = [url for url in urls if url in existing]
+        valid = set()
+        with FetchPool() as pool:
+            for url in urls:
+                if url not in existing:
+                    pool.submit(url, download_feed, url, tag=url)
+            for url, job in pool.results():
+                try:
+                    parsed = job.result().parsed
+                except Exception:
+                    parsed = None
+                if self.is_valid_feed(parsed):
+                    valid.add(url)
+        added = [url for url in urls if url in valid]
+        invalid = [url for url in urls if url not in existing and url not in valid]
+        c.executemany("INSERT OR IGNORE INTO rss_feeds (url) VALUES (?)", [(url,) for url in added])
+        self.conn.commit()
+        return added, invalid, duplicates
 
+    def export_articles(self, path, with_html=False):
+        """Write every article as one JSON object per line, streaming from the database; returns the count"""
+        c = self.conn.cursor()
+        html_columns = ", h.codec AS html_codec, h.body AS html_body" if with_html else ""
+        html_join = "LEFT JOIN html_archive h ON h.sha = a.html_sha" if with_html else ""
+        c.execute(f"""
+        SELECT a.url, a.title, a.source, a.fetched_date, a.publish_date, a.publish_ts, b.codec, b.body, f.simhash {html_columns}
+        FROM article a LEFT JOIN article_body b ON b.article_id = a.id
+        LEFT JOIN article_fingerprint f ON f.article_id = a.id {html_join}
+        ORDER BY a.id
+        """)
+        count = 0
+        with open_ndjson(path, "w") as f:
+            for row in c:
+                record = {key: row[key] for key in ("url", "title", "source", "fetched_date", "publish_date", "publish_ts")}
+                record["text"] = unpack_body(row['codec'], row['body']) if row['body'] is not None else None
+                record["simhash"] = row['simhash']
+                if with_html and row['html_body'] is not None:
+                    record["html"] = unpack_body(row['html_codec'], row['html_body'])
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                count += 1
+        return count
 
+    def import_articles(self, path):
+        """Stream articles from an NDJSON export into one transaction; returns (added, skipped)"""
+        c = self.conn.cursor()
+        added = skipped = 0
+        try:
+            with open_ndjson(path) as f:
+                for line_number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError as e:
+                        raise ValueError(f"line {line_number}: {e}") from None
+                    url = record.get("url")
+                    c.execute("SELECT 1 FROM article WHERE url = ?", (url,))
+                    if not url or c.fetchone():
+                        skipped += 1
+                        continue
+                    html_sha = self.archive_html(record["html"]) if record.get("html") else None
+                    site, publish_date, publish_ts, display_date = self.listing_metadata(record.get("source"), record.get("publish_date"))
+                    c.execute("""
+                    INSERT INTO article (url, title, source, fetched_date, publish_date, html_sha, site, publish_ts, display_date)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, (url, record.get("title"), record.get("source"), record.get("fetched_date"), publish_date, html_sha,
+                          site, record.get("publish_ts") or publish_ts, display_date))
+                    article_id = c.lastrowid
+                    c.execute("INSERT INTO article_body (article_id, codec, raw_size, body) VALUES (?, ?, ?, ?)",
+                              (article_id, *pack_body(record.get("text") or "")))
+                    # Exports carry the fingerprint; hashing every text here would dominate the import
+                    self.store_fingerprint(article_id, record["simhash"] if "simhash" in record else simhash(record.get("text")))
+                    added += 1
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+        return added, skipped
 
     # --- article ---
     def do_article(self, arg):
         """News article commands"""
         arg = arg.strip()
         if not arg:
-            print("Usage: `article list` | `article read NUM [NUM-NUM] *` | `article open NUM [NUM-NUM]` | `article speed NUM` | `article - NUM [NUM-NUM]| *` ")
+            print("Usage: `article list` | `article search QUERY` | `article read NUM [NUM-NUM] * [--stream]` | `article open NUM [NUM-NUM]` | `article speed NUM` | `article reparse NUM [NUM-NUM] *` | `article reindex` | `article export FILE` | `article import FILE` | `article dedup skip|group|off` | `article - NUM [NUM-NUM]| *` ")
             return
         args = arg.split()
         cmd = args[0]
 
-        def delete_articles(article_ids):
-            c = self.conn.cursor()
-            removed_any = False
-            for art_id in article_ids:
-                c.execute("DELETE FROM article WHERE id = ?", (art_id,))
-                if c.rowcount > 0:
-                    removed_any = True
-                    print(f"Deleted article ID {art_id}")
-                else:
-                    print(f"No article found with ID {art_id}")
-            if removed_any:
-                self.conn.commit()
-                self.renumber_ids("article")
-                self.reset_sqlite_autoincrement()
-
         # List article
         if cmd == "list":
-            if hasattr(self, "renumber_ids"):
-                self.renumber_ids("article")
-            if hasattr(self, "reset_sqlite_autoincrement"):
-                self.reset_sqlite_autoincrement()
-            c = self.conn.cursor()
-            c.execute("SELECT id, title, source, publish_date FROM article ORDER BY publish_date ASC")
-            articles = c.fetchall()
-            if not articles:
-                print("No articles saved yet")
-                return
-            print('\n'.join(map(self.article_summary, articles)))
+            options = {"--since": None, "--until": None, "--source": None, "--limit": None}
+            page = by_site = False
+            rest = args[1:]
+            while rest:
+                if rest[0] == "--page":
+                    page = True
+                    rest = rest[1:]
+                elif rest[0] == "--by-site":
+                    by_site = True
+                    rest = rest[1:]
+                elif rest[0] in options and len(rest) > 1:
+                    options[rest[0]] = rest[1]
+                    rest = rest[2:]
+                else:
+                    print("Usage: `article list [--since YYYY-MM-DD] [--until YYYY-MM-DD] [--source HOST] [--limit NUM] [--page | --by-site]`")
+                    return
+            since, until, source, limit = options["--since"], options["--until"], options["--source"], options["--limit"]
+            try:
+                if since:
+                    since = datetime.date.fromisoformat(since).isoformat()
+                if until:
+                    until = datetime.date.fromisoformat(until).isoformat()
+                if limit:
+                    limit = int(limit)
+                    if limit < 1:
+                        raise ValueError()
+            except ValueError:
+                print("Dates must look like YYYY-MM-DD and --limit must be a number greater than 0")
+                return
+            if by_site:
+                with metrics.timer("article.list"):
+                    site = False
+                    for a in self.iter_articles(since=since, source=source, limit=limit, until=until, by_site=True):
+                        if a['site'] != site:
+                            site = a['site']
+                            print(f"\n{site or '(unknown website)'}")
+                        print(f"  {self.article_summary(a)}")
+                    if site is False:
+                        print("No matching articles" if since or until or source else "No articles saved yet")
+                return
+            after = None
+            if page:
+                if self.list_cursor and not (since or until or source):
+                    after, since, until, source, last_limit = self.list_cursor
+                    limit = limit or last_limit
+                limit = limit or LIST_PAGE_SIZE
+            shown = 0
+            last = None
+            with metrics.timer("article.list"):
+                for a in self.iter_articles(after, since, source, limit + 1 if limit else None, until):
+                    if limit and shown == limit:
+                        print("-- more: `article list --page` --")
+                        break
+                    print(self.article_summary(a))
+                    shown += 1
+                    last = a
+                else:
+                    if not shown:
+                        print("No more articles" if after else "No matching articles" if since or until or source else "No articles saved yet")
+            self.list_cursor = ((last['ordinal'], last['publish_date'], last['id']) if last else after, since, until, source, limit)
 
         # Read article
         elif cmd == "read":
+            stream = "--stream" in args
+            args = [a for a in args if a != "--stream"]
             delete_after_read = False
             if len(args) > 1 and args[-1] == "-":
                 delete_after_read = True
                 args = args[:-1]
             ids_args = args[1:]
-            c = self.conn.cursor()
+            c = self.reader.cursor()
             if ids_args == ["*"]:
-                c.execute("SELECT id FROM article ORDER BY publish_date ASC")
-                articles_to_read = [r['id'] for r in c.fetchall()]
+                found = self.resolve_ordinals("article", "*", conn=self.reader)
+                articles_to_read = list(found)
             else:
                 id_list = []
                 for part in ids_args:
@@ -311,55 +2332,79 @@ class BriefShell(cmd.Cmd):
                         except ValueError:
                             continue
                 articles_to_read = id_list
+                found = self.resolve_ordinals("article", id_list, conn=self.reader)
             if not articles_to_read:
                 print("No valid article IDs to read")
                 return
             total = len(articles_to_read)
-            deleted_count = 0
-            for idx, article_id in enumerate(articles_to_read, 1):
-                c.execute("SELECT title, source, content, publish_date, url FROM article WHERE id = ?", (article_id,))
-                row = c.fetchone()
-                if not row:
-                    print(f"No article found with ID {article_id}")
-                    continue
-                title, source, content, publish_date, url = row
-                site_name = urlparse(source).hostname or "(unknown website)"
-                if site_name.startswith("www."):
-                    site_name = site_name[4:]
-                if publish_date:
+            deleted_ids = []
+            speech = AudioCache() if AudioCache.available() else None
+            if stream and not speech:
+                print("Streaming playback needs `festival` and `mpv`; reading whole articles instead")
+                stream = False
+            elif stream:
+                print("Press `n` to skip to the next paragraph, `q` to skip the current chunk of a few sentences")
+            synth = concurrent.futures.ThreadPoolExecutor(max_workers=1) if speech and not stream else None
+            pending = {}
+            def synthesize_ahead(position):
+                # Synthesis of the next articles overlaps playback of the current one
+                for ahead in range(position, min(position + TTS_LOOKAHEAD + 1, total)):
+                    ordinal = articles_to_read[ahead]
+                    if ahead in pending or ordinal not in found:
+                        continue
+                    text = self.load_body(found[ordinal]['id']) or ""
+                    pending[ahead] = (text, synth.submit(speech.synthesize, text, self.playback_speed))
+            try:
+                for idx, article_id in enumerate(articles_to_read, 1):
+                    if article_id not in found:
+                        print(f"No article found with ID {article_id}")
+                        continue
+                    if synth:
+                        synthesize_ahead(idx - 1)
+                    c.execute("SELECT title, source, site, display_date, url FROM article WHERE id = ?", (found[article_id]['id'],))
+                    title, source, site, display_date, url = c.fetchone()
+                    print(f"\nTitle: {title}")
+                    print(f"Date: {display_date or '(unknown)'}")
+                    print(f"Website: {site or '(unknown website)'}")
+                    if source != url:
+                        print(f"Feed: {source}")
+                    print(f"Reading article {idx} / {total} (ID {article_id})...")
+                    if synth:
+                        content, audio = pending.pop(idx - 1)
+                    else:
+                        content = self.load_body(found[article_id]['id']) or ""
+                    text_path = self.article_files.add(content)
+                    status = None
                     try:
-                        dt = datetime.datetime.strptime(publish_date, "%Y-%m-%d")
-                        publish_str = dt.strftime("%m/%d/%Y")
-                    except Exception:
-                        publish_str = publish_date
-                else:
-                    publish_str = "(unknown)"
-                print(f"\nTitle: {title}")
-                print(f"Date: {publish_str}")
-                print(f"Website: {site_name}")
-                if source != url:
-                    print(f"Feed: {source}")
-                print(f"Reading article {idx} / {total} (ID {article_id})...")
-                temp_filename = self.write_temp_file(content)
-                try:
-                    subprocess.run(["xdg-open", temp_filename], stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
-                    subprocess.run([
-                        TTS_SCRIPT,
-                        "--file", temp_filename,
-                        "--speed", str(self.playback_speed)
-                    ])
-                except subprocess.CalledProcessError as e:
-                    print(f"TTS playback failed for article {article_id}: {e}")
-                finally:
-                    os.remove(temp_filename)
-                if delete_after_read:
-                    c.execute("DELETE FROM article WHERE id = ?", (article_id,))
+                        subprocess.run(["xdg-open", text_path], stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+                        if stream:
+                            status = stream_speech(speech, content, self.playback_speed)
+                        elif speech:
+                            status = speech.play(audio.result())
+                        else:
+                            status = subprocess.run([
+                                TTS_SCRIPT,
+                                "--file", text_path,
+                                "--speed", str(self.playback_speed)
+                            ]).returncode
+                        if status:
+                            print(f"TTS playback failed for article {article_id}: player exited with status {status}")
+                    except (subprocess.CalledProcessError, OSError, RuntimeError) as e:
+                        print(f"TTS playback failed for article {article_id}: {e}")
+                    finally:
+                        self.article_files.release(text_path)
+                    # Only articles that were actually heard count as read, for a trailing `-` and the `read` retention rule
+                    if status != 0:
+                        continue
+                    self.conn.execute("UPDATE article SET read_at = ? WHERE id = ?", (time.time(), found[article_id]['id']))
                     self.conn.commit()
-                    deleted_count += 1
+                    if delete_after_read:
+                        deleted_ids.append(found[article_id]['id'])
+            finally:
+                if synth:
+                    synth.shutdown(wait=False, cancel_futures=True)
             if delete_after_read:
-                self.renumber_ids("article")
-                self.reset_sqlite_autoincrement()
-                print(f"Deleted {deleted_count} article(s)")
+                print(f"Deleted {self.delete_ids('article', set(deleted_ids))} article(s)")
             return
 
 
@@ -370,10 +2415,10 @@ class BriefShell(cmd.Cmd):
             if not ids_args:
                 print("Usage: `article open NUM [NUM-NUM]`")
                 return
-            c = self.conn.cursor()
-            if ids_args == "*":
-                c.execute("SELECT id FROM article ORDER BY id ASC")
-                articles_to_open = [r['id'] for r in c.fetchall()]
+            c = self.reader.cursor()
+            if ids_args == ["*"]:
+                found = self.resolve_ordinals("article", "*", conn=self.reader)
+                articles_to_open = list(found)
                 if not articles_to_open:
                     print("No articles to open")
                     return
@@ -382,25 +2427,121 @@ class BriefShell(cmd.Cmd):
                 if not articles_to_open:
                     print("No valid article IDs to open")
                     return
+                found = self.resolve_ordinals("article", articles_to_open, conn=self.reader)
             total = len(articles_to_open)
             for idx, article_id in enumerate(articles_to_open, 1):
-                c.execute("SELECT title, source, content FROM article WHERE id = ?", (article_id,))
-                row = c.fetchone()
-                if not row:
+                if article_id not in found:
                     print(f"No article found with ID {article_id}")
                     continue
-                title, source, content = row
+                c.execute("SELECT title, source FROM article WHERE id = ?", (found[article_id]['id'],))
+                title, source = c.fetchone()
+                content = self.load_body(found[article_id]['id'])
                 if not content or content.strip() == "":
-                    print(f"Article ID {article_id} content empty")
+                    print(f"Article ID {article_id} content empty (try `article reparse {article_id}`)")
                     continue
                 print(f"Opening article {idx} / {total} (ID {article_id}): {title}")
-                temp_filename = self.write_temp_file(content)
+                # Kept until the session ends (or ARTICLE_FILES_MAX newer ones are open) so the viewer can read it
+                text_path = self.article_files.add(content)
                 try:
-                    subprocess.run(["xdg-open", temp_filename], stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+                    subprocess.run(["xdg-open", text_path], stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
                 except subprocess.CalledProcessError as e:
                     print(f"Failed to open article {article_id}: {e}")
             return
 
+        # Search article
+        elif cmd == "search":
+            query = arg[len(cmd):].strip()
+            if not query:
+                print("Usage: `article search QUERY`")
+                return
+            self.flush()
+            c = self.reader.cursor()
+            try:
+                c.execute("""
+                SELECT o.ordinal, a.title, a.site, a.display_date, a.duplicate_of,
+                       snippet(article_fts, 1, '[', ']', '...', 12) AS snippet
+                FROM article_fts f
+                JOIN article a ON a.id = f.rowid
+                JOIN article_ordinal o ON o.id = a.id
+                WHERE article_fts MATCH ?
+                ORDER BY bm25(article_fts, 10.0, 1.0)
+                LIMIT ?
+                """, (query, SEARCH_LIMIT))
+                results = c.fetchall()
+            except sqlite3.OperationalError as e:
+                print(f"Invalid search query: {e}")
+                return
+            if not results:
+                print(f"No articles match: {query}")
+                return
+            for a in results:
+                print(self.article_summary(a))
+                print(f"    {' '.join(a['snippet'].split())}")
+
+        # Re-extract articles from archived HTML
+        elif cmd == "reparse":
+            ids_args = args[1:]
+            if not ids_args:
+                print("Usage: `article reparse NUM [NUM-NUM] *`")
+                return
+            if ids_args == ["*"]:
+                found = self.resolve_ordinals("article", "*")
+            else:
+                found = self.resolve_ordinals("article", self.parse_id_string(' '.join(ids_args)))
+            if not found:
+                print("No matching articles to reparse")
+                return
+            updated, unchanged, missing = self.reparse_articles(row['id'] for row in found.values())
+            print(f"Re-extracted {updated} article(s), {unchanged} unchanged, {missing} without archived HTML")
+
+        # Export articles as NDJSON
+        elif cmd == "export":
+            with_html = "--html" in args
+            rest = [a for a in args[1:] if a != "--html"]
+            if len(rest) != 1:
+                print("Usage: `article export FILE[.gz] [--html]`")
+                return
+            path = os.path.expanduser(rest[0])
+            try:
+                count = self.export_articles(path, with_html)
+            except OSError as e:
+                print(f"Cannot write {path}: {e}")
+                return
+            print(f"Exported {count} article(s) to {path}")
+
+        # Import articles from NDJSON
+        elif cmd == "import":
+            if len(args) != 2:
+                print("Usage: `article import FILE[.gz]`")
+                return
+            path = os.path.expanduser(args[1])
+            try:
+                added, skipped = self.import_articles(path)
+            except (OSError, ValueError, sqlite3.Error) as e:
+                print(f"Import from {path} failed, nothing was added: {e}")
+                return
+            print(f"Imported {added} article(s), skipped {skipped} already saved or without a URL")
+
+        # Duplicate handling
+        elif cmd == "dedup":
+            if len(args) == 1:
+                print(f"Near-duplicate articles: {self.duplicate_policy}")
+                return
+            if args[1] not in ("skip", "group", "off"):
+                print("Usage: `article dedup skip|group|off`")
+                return
+            self.set_setting("dedup.policy", None if args[1] == DUPLICATE_POLICY else args[1])
+            print(f"Near-duplicate articles will be {({'skip': 'skipped', 'group': 'saved and marked [duplicate]', 'off': 'saved as usual'})[args[1]]}")
+
+        # Rebuild search index
+        elif cmd == "reindex":
+            try:
+                self.rebuild_search_index()
+            except sqlite3.Error as e:
+                print(f"Failed to rebuild search index: {e}")
+                return
+            print("Search index rebuilt")
+
         # Spead article
         elif cmd == "speed":
             args = arg.strip().split()
@@ -424,15 +2565,13 @@ class BriefShell(cmd.Cmd):
             id_str = ' '.join(args[1:]).strip()
             self.delete_rows_with_confirmation(
                 table_name="article",
-                display_columns=["id", "title"],
-                id_str=id_str,
-                renumber_func=self.renumber_ids("article"),
-                reset_func=getattr(self, "reset_sqlite_autoincrement", None)
+                display_columns=["title"],
+                id_str=id_str
             )
             return
 
         else:
-            print(f"Unknown article command '{cmd}'. Available commands: `list`, `read`, `open`, `-`")
+            print(f"Unknown article command '{cmd}'. Available commands: `list`, `search`, `read`, `open`, `speed`, `reparse`, `reindex`, `export`, `import`, `dedup`, `-`")
 
 
 
@@ -443,7 +2582,7 @@ class BriefShell(cmd.Cmd):
         arg = arg.strip()
         args = arg.split()
         if not arg:
-            print("Usage: `rss fetch NUM [NUM-NUM] *` | `rss add URL [URL URL]` | `rss list` | `rss - NUM [NUM-NUM] *`")
+            print("Usage: `rss fetch NUM [NUM-NUM] *` | `rss add URL [URL URL]` | `rss list` | `rss health` | `rss import FILE` | `rss export [FILE]` | `rss - NUM [NUM-NUM] *`")
             return
         cmd = args[0]
         c = self.conn.cursor()
@@ -460,61 +2599,14 @@ class BriefShell(cmd.Cmd):
             except ValueError:
                 print("Specify a number greater than 0, e.g. rss fetch 5 1 2 or rss fetch 3 *")
                 return
-            feed_ids = args[2:]
-            if feed_ids == ["*"]:
-                c.execute("SELECT id FROM rss_feeds ORDER BY id ASC")
-                positions = [row['id'] for row in c.fetchall()]
-                placeholders = ','.join('?' for _ in positions)
-                c.execute(f"SELECT id, url FROM rss_feeds WHERE id IN ({placeholders}) ORDER BY id ASC", positions)
-                feeds = c.fetchall()
-            else:
-                feed_ids_int = []
-                try:
-                    feed_ids_int = [int(fid) for fid in feed_ids]
-                except ValueError:
-                    print("Feed IDs must be integers or *")
-                    return
-                placeholders = ','.join('?' for _ in feed_ids_int)
-                c.execute(f"SELECT id, url FROM rss_feeds WHERE id IN ({placeholders}) ORDER BY id ASC", feed_ids_int)
-                feeds = c.fetchall()
+            feeds = self.select_feeds(args[2:])
+            if feeds is None:
+                print("Feed IDs must be integers or *")
+                return
             if not feeds:
                 print("No matching RSS feeds found to fetch from")
                 return
-            def fetch_from_feed(feed_id, feed_url):
-                parsed = feedparser.parse(feed_url)
-                count = 0
-                for entry in parsed.entries[:num_to_fetch]:
-                    url = entry.link
-                    if url:
-                        c.execute("SELECT id FROM article WHERE url = ?", (url,))
-                        if c.fetchone():
-                            print(f"Already have article: {url}")
-                            continue
-                        try:
-                            article = Article(url)
-                            article.download()
-                            article.parse()
-                            title = article.title
-                            content = article.text
-                            fetched_date = article.publish_date.isoformat() if article.publish_date else None
-                            publish_date_obj = self.parse_publish_date(entry)
-                            publish_date = publish_date_obj.isoformat() if publish_date_obj else None
-                            c.execute("""
-                            INSERT INTO article (url, title, content, source, fetched_date, publish_date)
-                            VALUES (?, ?, ?, ?, ?, ?)
-                            """, (url, title, content, feed_url, fetched_date, publish_date))
-                            self.conn.commit()
-                            print(f"Saved article: {title}")
-                            count += 1
-                        except Exception as e:
-                            print(f"Failed to parse article {url}: {e}")
-                if count == 0:
-                    print(f"No new articles were added for feed ID {feed_id}")
-                else:
-                    print(f"Finished fetching {count} new articles for feed ID {feed_id}.")
-            for feed in feeds:
-                print(f"Fetching {num_to_fetch} entries from feed ID {feed['id']}: {feed['url']}")
-                fetch_from_feed(feed['id'], feed['url'])
+            self.fetch_feeds(feeds, num_to_fetch, skip_disabled=args[2:] == ["*"])
             return
 
         # Add RSS feed
@@ -522,32 +2614,82 @@ class BriefShell(cmd.Cmd):
             if len(args) < 2:
                 print("Usage: rss add URL [URL...]")
                 return
-            urls_to_add = args[1:]
-            for url in urls_to_add:
-                feed = feedparser.parse(url)
-                if feed.bozo or not hasattr(feed, 'feed') or not feed.feed:
-                    print(f"Invalid RSS feed URL or unable to parse feed: {url}")
-                    continue
-                try:
-                    c.execute("SELECT id FROM rss_feeds WHERE url = ?", (url,))
-                    if c.fetchone() is not None:
-                        print(f"You have already added this RSS feed: {url}")
-                        continue
-                    c.execute("INSERT INTO rss_feeds (url) VALUES (?)", (url,))
-                    inserted_id = c.lastrowid
-                    c.execute("UPDATE rss_feeds SET id = ? WHERE id = ?", (inserted_id, inserted_id))
-                    self.conn.commit()
-                    print(f"Added RSS feed: {url}")
-                except sqlite3.Error as e:
-                    print(f"Database error adding {url}: {e}")
+            try:
+                added, invalid, duplicates = self.add_feeds(args[1:])
+            except sqlite3.Error as e:
+                print(f"Database error adding feeds: {e}")
+                return
+            for url in duplicates:
+                print(f"You have already added this RSS feed: {url}")
+            for url in invalid:
+                print(f"Invalid RSS feed URL or unable to parse feed: {url}")
+            for url in added:
+                print(f"Added RSS feed: {url}")
+            return
+
+        # Import feeds from OPML
+        elif cmd == "import":
+            if len(args) < 2:
+                print("Usage: `rss import FILE.opml`")
+                return
+            path = os.path.expanduser(arg[len(cmd):].strip())
+            try:
+                urls = read_opml(path)
+            except (OSError, SyntaxError) as e:
+                print(f"Cannot read OPML from {path}: {e}")
+                return
+            if not urls:
+                print(f"No feeds found in {path}")
+                return
+            print(f"Checking {len(urls)} feeds...")
+            try:
+                added, invalid, duplicates = self.add_feeds(urls)
+            except sqlite3.Error as e:
+                print(f"Database error importing feeds: {e}")
+                return
+            for url in invalid:
+                print(f"Invalid RSS feed URL or unable to parse feed: {url}")
+            print(f"Imported {len(added)} feed(s), {len(duplicates)} already added, {len(invalid)} invalid")
+            return
+
+        # Export feeds as OPML
+        elif cmd == "export":
+            c.execute("SELECT url FROM rss_feeds ORDER BY id")
+            urls = [row['url'] for row in c.fetchall()]
+            if len(args) < 2:
+                write_opml(urls, sys.stdout)
+                return
+            path = os.path.expanduser(arg[len(cmd):].strip())
+            try:
+                with open(path, "w", encoding="utf-8") as f:
+                    write_opml(urls, f)
+            except OSError as e:
+                print(f"Cannot write {path}: {e}")
+                return
+            print(f"Exported {len(urls)} feed(s) to {path}")
             return
 
         # List RSS feed
         elif cmd == "list":
-            c.execute("SELECT id, url FROM rss_feeds ORDER BY id ASC")
-            feeds = c.fetchall()
-            for feed in feeds:
-                print(f"{feed['id']}. {feed['url']}")
+            for ordinal, feed in self.resolve_ordinals("rss_feeds", "*", ["url"]).items():
+                print(f"{ordinal}. {feed['url']}")
+            return
+
+        # Show fetch failures, backoff and latency per feed
+        elif cmd == "health":
+            columns = ["url", "failure_count", "last_error", "last_success_at", "disabled_until", "latency"]
+            now = time.time()
+            for ordinal, feed in self.resolve_ordinals("rss_feeds", "*", columns).items():
+                latency = f"{feed['latency']:.2f}s" if feed['latency'] is not None else "-"
+                if feed['disabled_until'] and feed['disabled_until'] > now:
+                    state = f"disabled until {self.format_timestamp(feed['disabled_until'])}"
+                elif feed['failure_count']:
+                    state = "failing"
+                else:
+                    state = "ok"
+                print(f"{ordinal}. {feed['url']} [{state}] failures: {feed['failure_count']}, latency: {latency}, last success: {self.format_timestamp(feed['last_success_at'])}")
+                if feed['failure_count'] and feed['last_error']:
+                    print(f"    last error: {feed['last_error']}")
             return
 
         # Delete RSS feeds
@@ -558,15 +2700,13 @@ class BriefShell(cmd.Cmd):
             id_str = ' '.join(args[1:]).strip()
             self.delete_rows_with_confirmation(
                 table_name="rss_feeds",
-                display_columns=["id", "url"],
-                id_str=id_str,
-                renumber_func=self.renumber_ids("rss_feeds"),
-                reset_func=getattr(self, "reset_sqlite_autoincrement", None)
+                display_columns=["url"],
+                id_str=id_str
             )
             return
 
         else:
-            print("Unknown `rss` command. Available: `fetch`, `add`, `list`, `-`")
+            print("Unknown `rss` command. Available: `fetch`, `add`, `list`, `health`, `import`, `export`, `-`")
 
 
 
@@ -586,31 +2726,189 @@ class BriefShell(cmd.Cmd):
             if len(args) < 2:
                 print("Usage: `url add URL`")
                 return
-            url = args[1]
-            c = self.conn.cursor()
-            c.execute("SELECT id FROM article WHERE url = ?", (url,))
-            if c.fetchone():
-                print(f"Already have article: {url}")
+            self.ingest(lambda ingestor: ingestor.add_url(args[1]), extract_workers=1)
+        else:
+            print("Unknown `url` command. Available: `add`")
+
+
+
+
+    # --- db ---
+    def do_db(self, arg):
+        """Database commands"""
+        args = arg.split()
+        if not args:
+            print("Usage: `db stats` | `db retention [RULE VALUE|off]` | `db prune [--max-age DAYS] [--per-feed NUM] [--max-size MB] [--read]` | `db vacuum` | `db tune [SETTING VALUE|default]`")
+            return
+        cmd = args[0]
+        c = self.conn.cursor()
+
+        # Storage statistics
+        if cmd == "stats":
+            c.execute("SELECT COUNT(*) FROM article")
+            articles = c.fetchone()[0]
+            c.execute("SELECT codec, COUNT(*) AS bodies, COALESCE(SUM(raw_size), 0) AS raw, COALESCE(SUM(LENGTH(body)), 0) AS packed FROM article_body GROUP BY codec")
+            codecs = c.fetchall()
+            raw = sum(row['raw'] for row in codecs)
+            packed = sum(row['packed'] for row in codecs)
+            c.execute("PRAGMA page_count")
+            page_count = c.fetchone()[0]
+            c.execute("PRAGMA page_size")
+            page_size = c.fetchone()[0]
+            print(f"Articles: {articles}")
+            print(f"Bodies: {format_size(raw)} raw, {format_size(packed)} compressed ({raw / packed if packed else 0:.1f}x)")
+            for row in codecs:
+                print(f"  {row['codec']}: {row['bodies']} bodies, {format_size(row['raw'])} -> {format_size(row['packed'])}")
+            c.execute("SELECT COUNT(*) AS pages, COALESCE(SUM(raw_size), 0) AS raw, COALESCE(SUM(LENGTH(body)), 0) AS packed FROM html_archive")
+            archive = c.fetchone()
+            print(f"HTML archive: {archive['pages']} pages, {format_size(archive['raw'])} raw, {format_size(archive['packed'])} compressed")
+            c.execute("PRAGMA freelist_count")
+            free_pages = c.fetchone()[0]
+            print(f"Database file: {format_size(page_count * page_size)} ({format_size(free_pages * page_size)} free)")
+            policy = self.retention_policy()
+            print(f"Retention: {self.describe_policy(policy) if policy else 'keep everything'}")
+            c.execute("PRAGMA journal_mode")
+            print(f"Storage: {c.fetchone()[0].upper()} journal, {self.describe_storage(self.storage_settings())}")
+
+        # Show or change the retention policy
+        elif cmd == "retention":
+            if len(args) == 1:
+                policy = self.retention_policy()
+                print(f"Retention: {self.describe_policy(policy) if policy else 'keep everything'}")
+                return
+            if args[1:] == ["off"]:
+                for rule in RETENTION_RULES:
+                    self.set_setting(f"retention.{rule}", None)
+                print("Retention: keep everything")
+                return
+            if len(args) != 3 or args[1] not in RETENTION_RULES:
+                print(f"Usage: `db retention RULE VALUE|off` or `db retention off`, where RULE is one of: {', '.join(RETENTION_RULES)}")
                 return
+            rule, value = args[1], args[2].lower()
+            if value == "off":
+                self.set_setting(f"retention.{rule}", None)
+            elif rule == "read":
+                if value != "on":
+                    print("Usage: `db retention read on|off`")
+                    return
+                self.set_setting("retention.read", "on")
+            else:
+                try:
+                    number = int(value)
+                    if number < 1:
+                        raise ValueError()
+                except ValueError:
+                    print(f"{rule} must be a whole number of {RETENTION_RULES[rule]}")
+                    return
+                self.set_setting(f"retention.{rule}", number)
+            policy = self.retention_policy()
+            print(f"Retention: {self.describe_policy(policy) if policy else 'keep everything'} (applied after each fetch and by `db prune`)")
+
+        # Apply retention rules now
+        elif cmd == "prune":
             try:
-                article = Article(url)
-                article.download()
-                article.parse()
-                title = article.title
-                content = article.text
-                fetched_date = article.publish_date.isoformat() if article.publish_date else None
-                publish_date_obj = self.parse_publish_date(article)
-                publish_date = publish_date_obj.isoformat() if publish_date_obj else None
-                c.execute("""
-                INSERT INTO article (url, title, content, source, fetched_date, publish_date)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """, (url, title, content, url, fetched_date, publish_date))
-                self.conn.commit()
-                print(f"Saved article: {title}")
-            except Exception as e:
-                print(f"Failed to parse article {url}: {e}")
+                policy = self.parse_retention_options(args[1:]) if len(args) > 1 else self.retention_policy()
+            except ValueError as e:
+                print(f"{e}. Usage: `db prune [--max-age DAYS] [--per-feed NUM] [--max-size MB] [--read]`")
+                return
+            if not policy:
+                print("No retention policy set; see `db retention` or give the rules, e.g. `db prune --max-age 30`")
+                return
+            confirm = input(f"Delete every article outside: {self.describe_policy(policy)}? [Y/n] ").strip().lower()
+            if confirm != 'y':
+                print("Pruning cancelled")
+                return
+            deleted = self.apply_retention(policy)
+            print(f"Deleted {sum(deleted.values())} article(s) ({self.describe_deleted(deleted)})")
+
+        # Give all free pages back to the filesystem
+        elif cmd == "vacuum":
+            freed = self.reclaim_space(budget=None)
+            # Freed pages leave the file once the write-ahead log is checkpointed
+            c.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            c.execute("PRAGMA page_size")
+            print(f"Released {format_size(freed * c.fetchone()[0])}")
+
+        # Show or change the storage pragmas
+        elif cmd == "tune":
+            if len(args) == 1:
+                print(f"Storage: {self.describe_storage(self.storage_settings())}")
+                return
+            if len(args) != 3 or args[1] not in STORAGE_SETTINGS:
+                print(f"Usage: `db tune SETTING VALUE|default` where SETTING is one of: {', '.join(STORAGE_SETTINGS)}")
+                return
+            name, value = args[1], args[2].upper()
+            if value == "DEFAULT":
+                value = None
+            elif name == "synchronous":
+                if value not in SYNCHRONOUS_MODES:
+                    print(f"synchronous must be one of: {', '.join(SYNCHRONOUS_MODES)}")
+                    return
+            else:
+                try:
+                    value = int(value)
+                    if value < (0 if name == "mmap-size" else 1):
+                        raise ValueError()
+                except ValueError:
+                    print(f"{name} must be a whole number of MB" + (" (0 turns it off)" if name == "mmap-size" else ""))
+                    return
+            self.set_setting(f"storage.{name}", value)
+            print(f"Storage: {self.describe_storage(self.tune_storage())}")
+
         else:
-            print("Unknown `url` command. Available: `add`")
+            print("Unknown `db` command. Available: `stats`, `retention`, `prune`, `vacuum`, `tune`")
+
+
+
+
+    # --- stats ---
+    def do_stats(self, arg):
+        """Timing and counters for this session"""
+        args = arg.split()
+        if not args:
+            snapshot = metrics.snapshot()
+            if not snapshot["stages"] and not snapshot["counters"]:
+                print("Nothing recorded yet")
+                return
+            if snapshot["stages"]:
+                width = max(len(stage) for stage in snapshot["stages"])
+                print(f"{'stage'.ljust(width)} {'count':>7} {'total':>9} {'mean':>9} {'p50':>9} {'p99':>9} {'max':>9}")
+                for stage, t in snapshot["stages"].items():
+                    times = ' '.join(f"{t[key] * 1000:>7.1f}ms" for key in ("total", "mean", "p50", "p99", "max"))
+                    print(f"{stage.ljust(width)} {t['count']:>7} {times}")
+            for name, value in snapshot["counters"].items():
+                print(f"{name}: {format_size(value) if name.startswith('bytes.') else value}")
+        elif args[0] == "json":
+            print(json.dumps(metrics.snapshot(), indent=2))
+        elif args[0] == "save" and len(args) == 2:
+            try:
+                metrics.write(args[1])
+                print(f"Appended metrics to {args[1]}")
+            except OSError as e:
+                print(f"Cannot write {args[1]}: {e}")
+        elif args[0] == "reset":
+            metrics.reset()
+            print("Metrics reset")
+        else:
+            print("Usage: `stats` | `stats json` | `stats save FILE` | `stats reset`")
+
+
+
+
+    # --- profile ---
+    def do_profile(self, arg):
+        """Run one command under cProfile, e.g. `profile rss fetch 5 *`"""
+        if not arg.strip():
+            print("Usage: `profile COMMAND`")
+            return
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(self.onecmd, arg)
+        finally:
+            # Extraction runs in worker processes and does not show up here
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(PROFILE_TOP)
 
 
 
@@ -618,7 +2916,7 @@ class BriefShell(cmd.Cmd):
     # --- cmd ---
     def do_cmd(self, arg):
         """Lists all available commands"""
-        commands = ["article\n", "rss\n", "url"]
+        commands = ["article\n", "rss\n", "url\n", "db\n", "stats\n", "profile"]
         print(''.join(commands))
 
 
@@ -631,7 +2929,7 @@ class BriefShell(cmd.Cmd):
             return super().do_help(arg)
         else:
             commands = [cmd[3:] for cmd in dir(self) if cmd.startswith('do_')]
-            order = ['article', 'rss', 'url', 'cmd', 'help', 'exit']
+            order = ['article', 'rss', 'url', 'db', 'stats', 'profile', 'cmd', 'help', 'exit']
             def sort_key(cmd):
                 try:
                     return order.index(cmd)
@@ -650,18 +2948,215 @@ class BriefShell(cmd.Cmd):
     def do_exit(self, arg):
         """Exit the shell"""
         print("Goodbye!")
+        self.article_files.close()
+        close_festival_worker()
+        self.reader.close()
         self.conn.close()
         return True
 
 
 
 
+# --- batch ---
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+DAEMON_MAX_SLEEP = 60
+DAEMON_MAINTENANCE_INTERVAL = 60 * 60
+
+def print_json(obj):
+    print(json.dumps(obj, ensure_ascii=False), flush=True)
+
+def batch_fetch(shell, args):
+    if args.all == bool(args.feeds):
+        print("Give feed numbers or --all", file=sys.stderr)
+        return EXIT_USAGE
+    feeds = shell.select_feeds(["*"] if args.all else args.feeds)
+    if feeds is None:
+        print("Feed IDs must be integers or ranges", file=sys.stderr)
+        return EXIT_USAGE
+    if not feeds:
+        print("No matching RSS feeds found to fetch from", file=sys.stderr)
+        return EXIT_FAILED
+    report = (lambda message: print(message, file=sys.stderr)) if args.json else print
+    results = shell.fetch_feeds(feeds, args.per_feed, report=report, deadline=args.deadline, skip_disabled=args.all)
+    if args.json:
+        for result in results:
+            print_json(result)
+    return EXIT_FAILED if any(r['status'] in ("failed", "feed_failed") for r in results) else EXIT_OK
+
+def batch_list(shell, args):
+    site = False
+    for a in shell.iter_articles(since=args.since, source=args.source, limit=args.limit, until=args.until, by_site=args.by_site):
+        if args.json:
+            print_json(a)
+        elif args.by_site:
+            if a['site'] != site:
+                site = a['site']
+                print(site or "(unknown website)")
+            print(f"  {shell.article_summary(a)}")
+        else:
+            print(shell.article_summary(a))
+    return EXIT_OK
+
+def batch_prune(shell, args):
+    c = shell.conn.cursor()
+    if args.all:
+        c.execute("SELECT id FROM article")
+        ids = [row['id'] for row in c.fetchall()]
+    elif args.ids:
+        ordinals = shell.parse_id_string(args.ids)
+        ids = [row['id'] for row in shell.resolve_ordinals("article", ordinals).values()]
+    else:
+        policy = shell.retention_policy() if args.policy else {}
+        rules = {"max-age": args.older_than, "per-feed": args.per_feed, "max-size": args.max_size, "read": args.read or None}
+        policy.update({rule: value for rule, value in rules.items() if value is not None})
+        if not policy:
+            print("Give --older-than DAYS, --per-feed NUM, --max-size MB, --read, --policy, --ids NUMS or --all", file=sys.stderr)
+            return EXIT_USAGE
+        deleted = shell.apply_retention(policy)
+        if args.json:
+            print_json({"deleted": sum(deleted.values()), "rules": deleted})
+        else:
+            print(f"Deleted {sum(deleted.values())} article(s) ({shell.describe_deleted(deleted)})")
+        return EXIT_OK
+    deleted = shell.delete_ids("article", ids)
+    if args.json:
+        print_json({"deleted": deleted})
+    else:
+        print(f"Deleted {deleted} article(s)")
+    return EXIT_OK
+
+def batch_daemon(shell, args):
+    """Poll each feed when it falls due until interrupted"""
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(EXIT_OK))
+    c = shell.conn.cursor()
+    print("Polling feeds (Ctrl-C to stop)", flush=True)
+    next_maintenance = time.monotonic()
+    try:
+        while True:
+            if time.monotonic() >= next_maintenance:
+                # Age-based rules expire articles even when nothing new arrives
+                shell.enforce_retention(report=lambda message: print(message, flush=True))
+                shell.reclaim_space()
+                next_maintenance = time.monotonic() + DAEMON_MAINTENANCE_INTERVAL
+            feeds = shell.due_feeds(time.time())
+            if feeds:
+                shell.fetch_feeds(feeds, args.per_feed, report=lambda message: print(message, flush=True))
+                if args.metrics:
+                    metrics.write(args.metrics, args.command)
+            c.execute("SELECT MIN(next_poll_at) FROM rss_feeds")
+            next_poll_at = c.fetchone()[0]
+            delay = DAEMON_MAX_SLEEP if next_poll_at is None else next_poll_at - time.time()
+            time.sleep(min(max(delay, 1), DAEMON_MAX_SLEEP))
+    except KeyboardInterrupt:
+        pass
+    return EXIT_OK
+
+def iso_date(value):
+    try:
+        return datetime.date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a YYYY-MM-DD date: {value}")
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be greater than 0: {value}")
+    return number
+
+def positive_float(value):
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be greater than 0: {value}")
+    return number
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="brief", description="RSS/Article reader with TTS. Run without arguments for the interactive shell.")
+    parser.add_argument("--timeout", type=positive_float, default=HTTP_TIMEOUT, metavar="SECONDS", help=f"HTTP request timeout (default {HTTP_TIMEOUT})")
+    parser.add_argument("--user-agent", default=USER_AGENT, metavar="STRING", help="User-Agent header sent to feeds and article sites")
+    parser.add_argument("--metrics", metavar="FILE", help="append per-stage timings and counters to FILE as a JSON line")
+    parser.add_argument("--profile", action="store_true", help="run the command under cProfile and print the slowest calls to stderr")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fetch = commands.add_parser("fetch", help="fetch new articles from RSS feeds")
+    fetch.add_argument("feeds", nargs="*", help="feed numbers or ranges as shown by `rss list`")
+    fetch.add_argument("--all", action="store_true", help="fetch from every feed")
+    fetch.add_argument("--per-feed", type=positive_int, default=10, metavar="NUM", help="entries to fetch per feed (default 10)")
+    fetch.add_argument("--deadline", type=positive_float, default=FETCH_DEADLINE, metavar="SECONDS", help=f"give up on downloads still running after this long (default {FETCH_DEADLINE})")
+    fetch.add_argument("--json", action="store_true", help="print one JSON object per article")
+    fetch.set_defaults(handler=batch_fetch)
+
+    list_ = commands.add_parser("list", help="list saved articles")
+    list_.add_argument("--since", type=iso_date, metavar="YYYY-MM-DD")
+    list_.add_argument("--until", type=iso_date, metavar="YYYY-MM-DD")
+    list_.add_argument("--source", metavar="HOST")
+    list_.add_argument("--limit", type=positive_int, metavar="NUM")
+    list_.add_argument("--by-site", action="store_true", help="group the articles by website")
+    list_.add_argument("--json", action="store_true", help="print one JSON object per article")
+    list_.set_defaults(handler=batch_list)
+
+    prune = commands.add_parser("prune", help="delete saved articles without prompting")
+    prune.add_argument("--older-than", "--max-age", type=positive_int, metavar="DAYS", help="articles published more than DAYS ago")
+    prune.add_argument("--per-feed", type=positive_int, metavar="NUM", help="all but the newest NUM articles of each feed")
+    prune.add_argument("--max-size", type=positive_int, metavar="MB", help="the oldest articles until the database fits in MB")
+    prune.add_argument("--read", action="store_true", help="articles that have been read")
+    prune.add_argument("--policy", action="store_true", help="apply the rules saved with `db retention` (options above override them)")
+    prune.add_argument("--ids", metavar="NUMS", help="article numbers, e.g. 1-3,5")
+    prune.add_argument("--all", action="store_true", help="every article")
+    prune.add_argument("--json", action="store_true")
+    prune.set_defaults(handler=batch_prune)
+
+    daemon = commands.add_parser("daemon", help="keep polling feeds, each on its own adaptive interval")
+    daemon.add_argument("--per-feed", type=positive_int, default=10, metavar="NUM", help="entries to fetch per feed (default 10)")
+    daemon.set_defaults(handler=batch_daemon)
+    return parser
+
+def run_batch(argv):
+    args = build_parser().parse_args(argv)
+    try:
+        shell = BriefShell(report=lambda message: print(message, file=sys.stderr))
+    except sqlite3.Error as e:
+        print(f"Cannot open {DB_FILENAME}: {e}", file=sys.stderr)
+        return EXIT_FAILED
+    try:
+        if (args.timeout, args.user_agent) != (HTTP_TIMEOUT, USER_AGENT):
+            configure_http(args.timeout, args.user_agent)
+        with metrics.timer(f"command.{args.command}"):
+            if args.profile:
+                import cProfile
+                import pstats
+                profiler = cProfile.Profile()
+                try:
+                    status = profiler.runcall(args.handler, shell, args)
+                finally:
+                    pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(PROFILE_TOP)
+            else:
+                status = args.handler(shell, args)
+        if args.metrics:
+            try:
+                metrics.write(args.metrics, args.command)
+            except OSError as e:
+                print(f"Cannot write metrics to {args.metrics}: {e}", file=sys.stderr)
+                return EXIT_FAILED
+        return status
+    except ImportError as e:
+        print(f"Missing dependency: {e}. Run brief interactively once to install it", file=sys.stderr)
+        return EXIT_FAILED
+    finally:
+        shell.reader.close()
+        shell.conn.close()
+
+
 if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        sys.exit(run_batch(sys.argv[1:]))
     install_packages()
+    print("Welcome to brief - RSS/Article Reader with TTS")
     shell = BriefShell()
     while True:
         try:
             shell.cmdloop()
             break
         except KeyboardInterrupt:
-            print("\nPress 'exit' to quit")
\ No newline at end of file
+            print("\nPress 'exit' to quit")